@@ -0,0 +1,207 @@
+"""Synthetic message firehose for WordFilter.on_message, backed by the in-memory SQLite backend.
+
+Run from the repository root:
+    python -m benchmarks.wordfilter_bench --output bench_results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from functions.chatmanager import WordFilter
+from utils.database import SQLiteCursor, SQLiteDatabase
+from utils.infractions import InfractionLog
+from utils.migrations import apply_migrations
+from utils.repository import ModerationRepository
+from utils.writebehind import PointWriteBuffer
+
+# Filtered words and filler text use disjoint alphabets so hits only happen where planted
+WORD_LETTERS = "abcdefghijklm"
+FILLER_LETTERS = "nopqrstuvwxyz"
+
+
+class CountingCursor(SQLiteCursor):
+    """SQLite cursor that counts every statement it runs."""
+
+    def __init__(self, cursor, counter):
+        super().__init__(cursor)
+        self.counter = counter
+
+    def execute(self, query, params=None):
+        self.counter.statements += 1
+        super().execute(query, params)
+
+    def executemany(self, query, seq_params):
+        self.counter.statements += 1
+        super().executemany(query, seq_params)
+
+
+class CountingSQLiteDatabase(SQLiteDatabase):
+    """In-memory SQLite backend that counts round trips and statements."""
+
+    def __init__(self):
+        super().__init__({"path": ":memory:"})
+        self.round_trips = 0
+        self.statements = 0
+        self.cursor_class = lambda cursor: CountingCursor(cursor, self)
+
+    async def run(self, func, transaction=False, label=None):
+        self.round_trips += 1
+        return await super().run(func, transaction=transaction, label=label)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = 1
+        self.sent = 0
+
+    async def send(self, content):
+        self.sent += 1
+
+
+def random_token(rng, letters, min_length=5, max_length=10):
+    return "".join(rng.choice(letters) for _ in range(rng.randint(min_length, max_length)))
+
+
+async def build_bot(words_per_guild, guilds, rng, write_behind=False):
+    db = CountingSQLiteDatabase()
+    infraction_log = InfractionLog(db, {})
+    repository = ModerationRepository(db, infraction_log)
+    await apply_migrations(db)
+
+    word_lists = {}
+    for guild_id in range(1, guilds + 1):
+        words = {}
+        while len(words) < words_per_guild:
+            words[random_token(rng, WORD_LETTERS)] = rng.randint(1, 50)
+        word_lists[guild_id] = list(words)
+        await repository.set_mod_role_id(guild_id, 0)
+        await repository.set_chat_words(guild_id, words)
+
+    config = {"cache": {"guild_words_size": max(guilds, 1)}}
+    point_buffer = PointWriteBuffer(repository, {"enabled": write_behind})
+    bot = SimpleNamespace(db=db, config=config, infraction_log=infraction_log, repository=repository, point_buffer=point_buffer)
+    return bot, word_lists
+
+
+def build_messages(count, message_length, hit_rate, word_lists, rng):
+    """Builds fake discord.Message objects, planting one filtered word in hit_rate of them."""
+    channel = FakeChannel()
+    guild_ids = list(word_lists)
+    messages = []
+    for index in range(count):
+        guild_id = rng.choice(guild_ids)
+        filler = []
+        length = 0
+        while length < message_length:
+            token = random_token(rng, FILLER_LETTERS, 2, 8)
+            filler.append(token)
+            length += len(token) + 1
+        if word_lists[guild_id] and rng.random() < hit_rate:
+            filler.insert(rng.randrange(len(filler) + 1), rng.choice(word_lists[guild_id]))
+        author_id = 1000 + index % 500
+        messages.append(SimpleNamespace(
+            content=" ".join(filler)[:max(message_length, 1) + 16],
+            author=SimpleNamespace(bot=False, id=author_id, mention=f"<@{author_id}>"),
+            guild=SimpleNamespace(id=guild_id),
+            channel=channel,
+        ))
+    return messages, channel
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_case(words_per_guild, message_length, hit_rate, guilds, messages_per_case, seed, write_behind=False):
+    rng = random.Random(seed)
+    bot, word_lists = await build_bot(words_per_guild, guilds, rng, write_behind)
+    cog = WordFilter(bot)
+    messages, channel = build_messages(messages_per_case, message_length, hit_rate, word_lists, rng)
+
+    latencies = []
+    bot.db.round_trips = bot.db.statements = 0
+    bot.point_buffer.start()
+    start = time.perf_counter()
+    for message in messages:
+        message_start = time.perf_counter()
+        await cog.on_message(message)
+        latencies.append(time.perf_counter() - message_start)
+    # Buffered accruals are committed before the clock stops so their round trips are counted
+    await bot.point_buffer.stop()
+    elapsed = time.perf_counter() - start
+    # Warnings are coalesced per channel, send whatever is still waiting on its window
+    await cog.notifier.flush_all()
+
+    result = {
+        "words_per_guild": words_per_guild,
+        "message_length": message_length,
+        "hit_rate": hit_rate,
+        "guilds": guilds,
+        "messages": len(messages),
+        "throughput_msgs_per_sec": len(messages) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "db_round_trips_per_msg": bot.db.round_trips / len(messages),
+        "db_statements_per_msg": bot.db.statements / len(messages),
+        "warnings_sent": channel.sent,
+        "write_behind": write_behind,
+    }
+    bot.db.close()
+    return result
+
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(",") if item]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark WordFilter.on_message with synthetic traffic.")
+    parser.add_argument("--messages", type=int, default=2000, help="messages per case")
+    parser.add_argument("--words", default="10,100,1000", help="words per guild to sweep")
+    parser.add_argument("--lengths", default="50,500,2000", help="message lengths to sweep")
+    parser.add_argument("--hit-rates", default="0,0.01,0.1", help="fraction of messages containing a filtered word")
+    parser.add_argument("--guilds", default="1,10,100", help="guild counts to sweep")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--write-behind", action="store_true", help="buffer point accruals and group-commit them")
+    parser.add_argument("--output", default="bench_results.json", help="where to save the JSON results")
+    args = parser.parse_args()
+
+    results = []
+    cases = itertools.product(
+        parse_list(args.words, int),
+        parse_list(args.lengths, int),
+        parse_list(args.hit_rates, float),
+        parse_list(args.guilds, int),
+    )
+    print(f"{'words':>6} {'len':>6} {'hits':>6} {'guilds':>6} {'msg/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'db/msg':>7}")
+    for words, length, hit_rate, guilds in cases:
+        result = await run_case(words, length, hit_rate, guilds, args.messages, args.seed, args.write_behind)
+        results.append(result)
+        print(
+            f"{words:>6} {length:>6} {hit_rate:>6} {guilds:>6} {result['throughput_msgs_per_sec']:>10.0f} "
+            f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} {result['db_round_trips_per_msg']:>7.3f}"
+        )
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "benchmark": "wordfilter_on_message",
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "results": results,
+        }, f, indent=4)
+    print(f"Saved {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
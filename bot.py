@@ -1,77 +1,35 @@
-import io
-import shutil
-import zipfile
 import discord
+from discord import app_commands
 from discord.ext import commands
 import os
 import json
+import time
+import asyncio
 import tracemalloc
 import logging
-import os
-import mysql.connector
-import requests
+import signal
+import traceback
+from utils.bans import BanIndex
+from utils.command_sync import sync_if_changed
+from utils.database import create_database
+from utils.dispatcher import ActionDispatcher
+from utils.infractions import InfractionLog
+from utils.metrics import COMMAND_LATENCY, MetricsServer
+from utils.migrations import apply_migrations
+from utils.permissions import MissingModRole, PermissionService
+from utils.repository import ModerationRepository
+from utils.updater import load_github
+from utils.writebehind import PointWriteBuffer
 
 #pip install mysql-connector-python
 #pip install discord.py
 #pip install requests
 
-handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
-logging.basicConfig(level=logging.INFO, handlers=[handler])
+# Everything with side effects (log files, the GitHub pull, the database pool, the bot itself) happens in main(),
+# because spawned worker processes, such as the normalization pool's, re-import this module
 
-def download_repo_as_zip(repo_url, temp_folder):
-    # Remove the need for a token, use a public URL for downloading the zip file
-    zip_url = f"{repo_url}/archive/refs/heads/main.zip"
-    print(f"Downloading repository from {zip_url}...")
-    
-    try:
-        response = requests.get(zip_url)
-        response.raise_for_status()  # Raise an error for HTTP errors
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download repository: {e}")
-        raise
-    
-    print(f"Extracting ZIP file to {temp_folder}...")
-    
-    try:
-        with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
-            zip_file.extractall(temp_folder)
-    except zipfile.BadZipFile as e:
-        print(f"Failed to extract ZIP file: {e}")
-        raise
-    
-    print(f"Repository extracted to {temp_folder}.")
-
-def extract_functions_folder(temp_folder, target_folder):
-    repo_folder = os.path.join(temp_folder, config['repo_temp'])
-    functions_folder = os.path.join(repo_folder, "functions")
-    if not os.path.exists(functions_folder):
-        raise FileNotFoundError(f"'functions' folder not found in {repo_folder}.")
-    if os.path.exists(target_folder):
-        print(f"Removing existing target folder: {target_folder}")
-        shutil.rmtree(target_folder)
-    print(f"Copying 'functions' folder to {target_folder}...")
-    os.makedirs(target_folder, exist_ok=True)
-    for item in os.listdir(functions_folder):
-        source = os.path.join(functions_folder, item)
-        destination = os.path.join(target_folder, item)
-        if os.path.isdir(source):
-            shutil.copytree(source, destination, dirs_exist_ok=True)
-        else:
-            shutil.copy2(source, destination)
-
-def load_github():
-    if config['use_Git']:
-        print("Pulling repository from GitHub...")
-        repo_url = config['repo_url']
-        temp_folder = "repository_contents"
-        target_folder = "functions"
-        try:
-            download_repo_as_zip(repo_url, temp_folder)  # No need for token
-            extract_functions_folder(temp_folder, target_folder)
-        finally:
-            if os.path.exists(temp_folder):
-                print(f"Cleaning up temporary folder: {temp_folder}")
-                shutil.rmtree(temp_folder)
+# Prefix and bot initialization
+PREFIX = "!"
 
 def load_config():
     config_file = "datastores/config.json"
@@ -83,75 +41,163 @@ def load_config():
     except FileNotFoundError:
         print(f"{config_file} not found...")
     return config
-config = load_config()
-load_github()
-
-# Define the intents you want your bot to have
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
-intents.guilds = True
-
-# Prefix and bot initialization
-PREFIX = "!"
-
-# Load application_id as an integer
-application_id = int(config['application_id'])
-bot = commands.AutoShardedBot(command_prefix=PREFIX, intents=intents, application_id=application_id, help_command=None)
-
-# Set up the database connection
-db_config = config['database']
-db_connection = mysql.connector.connect(
-    host=db_config['host'],
-    user=db_config['user'],
-    password=db_config['password'],
-    database=db_config['database'],
-    autocommit=True,
-    connection_timeout=6000
-)
-# Store the connection in the bot instance
-bot.db_connection = db_connection
-
-# Start memory tracking
-tracemalloc.start()
 
 # Function to load all Python files from a directory as extensions
-async def load_extensions_from_folder(folder):
-    for filename in os.listdir(folder):
-        if filename.endswith('.py') and filename != '__init__.py':
-            module_name = filename[:-3]
-            module_path = f'{folder}.{module_name}'
-            try:
-                await bot.load_extension(module_path)
-                print(f'Loaded extension: {module_path}')
-            except Exception as e:
-                print(f'Failed to load extension {module_path}. Reason: {e}')
-
-@bot.event
-async def on_ready():
-    activity = discord.Activity(type=discord.ActivityType.playing, name=config['status'])
-    await bot.change_presence(status=discord.Status.online, activity=activity)
-    print(f'Logged in as {bot.user.name} ({bot.user.id})')
-    print(f"Shard ID: {bot.shard_id}")
-    print(f"Total Shards: {bot.shard_count}")
-    
-    for shard_id, latency in bot.latencies:
-        print(f"Shard ID: {shard_id} | Latency: {latency*1000:.2f}ms")
-
-# Event: Sync commands when bot joins a new guild
-@bot.event
-async def on_guild_join(guild):
-    await bot.tree.sync(guild=guild)
-
-# Setup hook to load extensions
-async def setup_hook():
-    await load_extensions_from_folder('functions')
-    await bot.tree.sync()
-
-# Assign setup_hook to the bot
-bot.setup_hook = setup_hook
-
-# Run the bot with your token
-if __name__ == '__main__':
+async def load_extension_timed(bot, module_path):
+    start = time.perf_counter()
+    try:
+        await bot.load_extension(module_path)
+        print(f'Loaded extension: {module_path} in {(time.perf_counter() - start) * 1000:.1f}ms')
+    except Exception as e:
+        print(f'Failed to load extension {module_path}. Reason: {e}')
+
+async def load_extensions_from_folder(bot, folder):
+    module_paths = [
+        f'{folder}.{filename[:-3]}'
+        for filename in os.listdir(folder)
+        if filename.endswith('.py') and filename != '__init__.py'
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*(load_extension_timed(bot, module_path) for module_path in module_paths))
+    print(f'Loaded {len(module_paths)} extensions in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+# Record when each interaction reaches the command tree so its latency can be measured
+async def interaction_check(interaction: discord.Interaction) -> bool:
+    interaction.extras['started_at'] = time.perf_counter()
+    return True
+
+def observe_command(interaction: discord.Interaction, outcome):
+    started_at = interaction.extras.get('started_at')
+    if started_at is not None and interaction.command is not None:
+        COMMAND_LATENCY.observe(time.perf_counter() - started_at, command=interaction.command.qualified_name, outcome=outcome)
+
+def create_bot(config, cluster_id):
+    """Builds the bot, its data access layer and its event handlers."""
+    # Define the intents you want your bot to have
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    intents.guilds = True
+
+    # Load application_id as an integer
+    application_id = int(config['application_id'])
+    # Cluster workers only run the contiguous shard range assigned by the launcher
+    shard_options = {}
+    if os.environ.get('SHARD_IDS') and os.environ.get('SHARD_COUNT'):
+        shard_options['shard_ids'] = [int(shard_id) for shard_id in os.environ['SHARD_IDS'].split(',')]
+        shard_options['shard_count'] = int(os.environ['SHARD_COUNT'])
+    bot = commands.AutoShardedBot(command_prefix=PREFIX, intents=intents, application_id=application_id, help_command=None, **shard_options)
+
+    # Store the configuration, the database backend and its data access layer in the bot instance
+    bot.config = config
+    bot.cluster_id = cluster_id
+    bot.db = create_database(config['database'])
+    bot.infraction_log = InfractionLog(bot.db, config.get('infraction_log'))
+    bot.repository = ModerationRepository(bot.db, bot.infraction_log, config.get('decay'), config.get('cache'))
+    bot.permissions = PermissionService(bot.repository, config.get('cache'))
+    bot.dispatcher = ActionDispatcher(config.get('dispatcher'))
+    bot.point_buffer = PointWriteBuffer(bot.repository, config.get('write_behind'))
+    bot.ban_index = BanIndex(config.get('cache'))
+    bot.metrics = MetricsServer(bot, config.get('metrics'))
+
+    @bot.event
+    async def on_ready():
+        activity = discord.Activity(type=discord.ActivityType.playing, name=config['status'])
+        await bot.change_presence(status=discord.Status.online, activity=activity)
+        print(f'Logged in as {bot.user.name} ({bot.user.id})')
+        print(f"Shard ID: {bot.shard_id}")
+        print(f"Total Shards: {bot.shard_count}")
+
+        for shard_id, latency in bot.latencies:
+            print(f"Shard ID: {shard_id} | Latency: {latency*1000:.2f}ms")
+
+    bot.tree.interaction_check = interaction_check
+
+    @bot.event
+    async def on_app_command_completion(interaction: discord.Interaction, command):
+        observe_command(interaction, "success")
+
+    # Reply to failed permission checks instead of logging them as errors
+    @bot.tree.error
+    async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, MissingModRole):
+            observe_command(interaction, "denied")
+            await interaction.response.send_message(str(error), ephemeral=True)
+            return
+        observe_command(interaction, "error")
+        print(f"Error in command {interaction.command.name if interaction.command else 'unknown'}: {error}")
+        traceback.print_exception(type(error), error, error.__traceback__)
+        # Answer the user so the command doesn't just show "The application did not respond"
+        try:
+            if interaction.response.is_done():
+                await interaction.followup.send("An unexpected error occurred.", ephemeral=True)
+            else:
+                await interaction.response.send_message("An unexpected error occurred.", ephemeral=True)
+        except discord.HTTPException:
+            pass
+
+    # Event: Sync guild commands when bot joins a new guild, global commands already reach it
+    @bot.event
+    async def on_guild_join(guild):
+        if bot.tree.get_commands(guild=guild):
+            await sync_if_changed(bot.tree, guild=guild)
+
+    # Setup hook to load extensions
+    async def setup_hook():
+        bot.dispatcher.start()
+        bot.point_buffer.start()
+        # cluster.py stops workers with SIGTERM, close cleanly so buffered points are flushed
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            pass
+        await bot.metrics.start(port_offset=int(cluster_id or 0))
+        # cluster.py migrates once before launching workers
+        if cluster_id is None:
+            await apply_migrations(bot.db)
+        await load_extensions_from_folder(bot, 'functions')
+        # Global commands only need syncing once per cluster
+        if cluster_id in (None, '0'):
+            await sync_if_changed(bot.tree)
+
+    # Assign setup_hook to the bot
+    bot.setup_hook = setup_hook
+
+    # Flush buffered writes and queued outbound actions before the connection closes
+    discord_close = bot.close
+
+    async def close():
+        await bot.point_buffer.stop()
+        await bot.dispatcher.stop()
+        await discord_close()
+
+    bot.close = close
+    return bot
+
+def main():
+    # Set by cluster.py when this process is one worker of a multi-process cluster
+    cluster_id = os.environ.get('CLUSTER_ID')
+
+    log_file = f'discord-cluster{cluster_id}.log' if cluster_id is not None else 'discord.log'
+    handler = logging.FileHandler(filename=log_file, encoding='utf-8', mode='w')
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    config = load_config()
+    # The cluster launcher pulls once before spawning workers
+    if cluster_id is None:
+        load_github(config)
+
+    bot = create_bot(config, cluster_id)
+
+    # Start memory tracking, exported through the metrics endpoint
+    tracemalloc.start()
+
+    # Run the bot with your token
     token = config['token']
-    bot.run(token, log_handler=handler, log_level=logging.INFO)
+    try:
+        bot.run(token, log_handler=handler, log_level=logging.INFO)
+    finally:
+        bot.db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import requests
+from utils.database import create_database
+from utils.migrations import apply_migrations
+from utils.updater import load_github
+
+# Workers that stay up this long have their restart backoff reset
+STABLE_SECONDS = 60
+MAX_BACKOFF = 60
+
+
+def load_config():
+    config_file = "datastores/config.json"
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+        print(f"Loaded configuration from {config_file}.")
+    return config
+
+
+def recommended_shard_count(token):
+    """Asks Discord how many shards the bot should run."""
+    response = requests.get(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}"},
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.json()['shards']
+
+
+def shard_ranges(shard_count, processes):
+    """Splits shard IDs into contiguous ranges, one per process."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for cluster_id in range(processes):
+        end = start + size + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Worker:
+    """One bot.py process owning a contiguous range of shards."""
+
+    def __init__(self, cluster_id, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.started_at = 0
+        self.backoff = 1
+        self.restart_at = 0
+
+    def start(self):
+        env = dict(os.environ)
+        env['CLUSTER_ID'] = str(self.cluster_id)
+        env['SHARD_IDS'] = ",".join(str(shard_id) for shard_id in self.shard_ids)
+        env['SHARD_COUNT'] = str(self.shard_count)
+        self.process = subprocess.Popen([sys.executable, "bot.py"], env=env)
+        self.started_at = time.monotonic()
+        print(f"Started cluster {self.cluster_id} (pid {self.process.pid}) with shards {self.shard_ids}")
+
+    def check(self):
+        """Restarts the worker with exponential backoff if it has exited."""
+        if self.process is None or self.process.poll() is None:
+            return
+        now = time.monotonic()
+        if not self.restart_at:
+            if now - self.started_at >= STABLE_SECONDS:
+                self.backoff = 1
+            print(f"Cluster {self.cluster_id} exited with code {self.process.returncode}, restarting in {self.backoff}s")
+            self.restart_at = now + self.backoff
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+        elif now >= self.restart_at:
+            self.restart_at = 0
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+def migrate(config):
+    """Applies pending schema migrations once so workers never race each other on DDL."""
+    db = create_database(config['database'])
+    try:
+        asyncio.run(apply_migrations(db))
+    finally:
+        db.close()
+
+
+def main():
+    config = load_config()
+    cluster_config = config.get('cluster', {})
+    load_github(config)
+    migrate(config)
+
+    shard_count = cluster_config.get('shard_count') or recommended_shard_count(config['token'])
+    processes = cluster_config.get('processes') or os.cpu_count() or 1
+    workers = [
+        Worker(cluster_id, shard_ids, shard_count)
+        for cluster_id, shard_ids in enumerate(shard_ranges(shard_count, processes))
+    ]
+    print(f"Launching {len(workers)} clusters for {shard_count} shards")
+
+    running = True
+
+    def shutdown(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    for worker in workers:
+        worker.start()
+    try:
+        while running:
+            for worker in workers:
+                worker.check()
+            time.sleep(1)
+    finally:
+        print("Stopping clusters...")
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,112 +1,104 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
+from utils.permissions import is_moderator
 from datetime import datetime
+from utils.cache import LRUCache
+from utils.matcher import WordMatcher
+from utils.metrics import LISTENER_LATENCY
+from utils.notifications import NotificationCoalescer
+from utils.normalize import NormalizationPool, NormalizedMatcher
 
 
 class WordFilter(commands.Cog):
      def __init__(self, bot):
           self.bot = bot
-          self.conn = bot.db_connection
-          self.cursor = self.conn.cursor()
-
-     def reconnect_database(self):
-          """Reconnects to the database if needed."""
-          try:
-               self.conn.ping(reconnect=True, attempts=3, delay=5)
-          except Exception as e:
-               print(f"Error reconnecting to the database: {e}")
-
-     def fetch_chat_words(self, guild_id):
+          self.repository = bot.repository
+          # Compiled chat_words matcher per guild so on_message does not query the database
+          self.word_cache = LRUCache(bot.config.get('cache', {}).get('guild_words_size', 1000))
+          # Bumped by every /filter write, so a matcher built from a read that started earlier is not cached
+          self.word_generations = {}  # guild_id -> generation
+          # Warnings are batched per channel so a burst of hits sends one message per window
+          self.notifier = NotificationCoalescer(bot.config.get('filter', {}).get('notify_window', 5))
+          # Optional evasion-resistant matching; normalization runs on a worker pool off the event loop
+          normalization = bot.config.get('filter', {}).get('normalization', {})
+          if normalization.get('enabled'):
+               self.normalizer = NormalizationPool(normalization)
+               self.matcher_class = NormalizedMatcher
+          else:
+               self.normalizer = None
+               self.matcher_class = WordMatcher
+
+     async def cog_unload(self):
+          await self.notifier.flush_all()
+          if self.normalizer is not None:
+               self.normalizer.close()
+
+     async def fetch_chat_words(self, guild_id):
           """Fetch the chat_words column from the guild_settings table."""
           try:
-               self.cursor.execute(
-                    "SELECT chat_words FROM guild_settings WHERE guild_id = %s",
-                    (guild_id,),
-               )
-               result = self.cursor.fetchone()
-               return json.loads(result[0]) if result and result[0] else {}
+               return await self.repository.get_chat_words(guild_id)
           except Exception as e:
                print(f"Error fetching chat_words: {e}")
                return {}
 
-     async def has_permission(self, interaction: discord.Interaction) -> bool:
-          """Check if the user is an admin or has the mod role from the database."""
-          guild_id = interaction.guild_id
-          user = interaction.user
-
-          # Check if the user is an admin
-          if user.guild_permissions.administrator:
-               return True
-
-          # Check if the user has the mod role
+     async def get_matcher(self, guild_id):
+          """Return the cached word matcher for a guild, building it on a cache miss."""
+          matcher = self.word_cache.get(guild_id)
+          if matcher is not None:
+               return matcher
+          generation = self.word_generations.get(guild_id, 0)
           try:
-               self.cursor.execute(
-                    "SELECT mod_role_id FROM guild_settings WHERE guild_id = %s",
-                    (guild_id,),
-               )
-               result = self.cursor.fetchone()
-               if result:
-                    mod_role_id = result[0]
-                    mod_role = interaction.guild.get_role(mod_role_id)
-                    if mod_role and mod_role in user.roles:
-                         return True
+               chat_words = await self.repository.get_chat_words(guild_id)
           except Exception as e:
-               print(f"Error checking permissions: {e}")
-          return False
-     
-     def update_user_points(self, guild_id, user_id, word, points):
+               # Don't cache a failed lookup, the next message will retry
+               print(f"Error fetching chat_words: {e}")
+               return self.matcher_class()
+          matcher = self.matcher_class(chat_words)
+          if self.word_generations.get(guild_id, 0) == generation:
+               self.word_cache.set(guild_id, matcher)
+          return matcher
+
+     async def update_user_points(self, guild_id, user_id, word, points, matched_text=None):
+          log_entry = {
+               "action": "filtered_word_detected",
+               "word": word,
+               "points_added": points,
+               "timestamp": datetime.now().isoformat(),
+               "action_by_name": "Bot", 
+               "note": f"Modded by Progressive Bot - Chat Infraction word: {word}", 
+          }
+          if matched_text is not None:
+               # The text as written, which can differ from the word when normalization caught an evasion
+               log_entry["matched_text"] = matched_text
+
           try:
-               # Fetch current user data
-               self.cursor.execute(
-                    "SELECT points, log_json FROM users WHERE guild_id = %s AND user_id = %s",
-                    (guild_id, user_id),
-               )
-               result = self.cursor.fetchone()
-               current_points = result[0] if result else 0
-               log_json = json.loads(result[1]) if result and result[1] else []
-
-               # Update points and log
-               new_points = current_points + points
-               log_entry = {
-                    "action": "filtered_word_detected",
-                    "word": word,
-                    "points_added": points,
-                    "timestamp": datetime.now().isoformat(),
-                    "action_by_name": "Bot", 
-                    "note": f"Modded by Progressive Bot - Chat Infraction word: {word}", 
-               }
-               log_json.append(log_entry)
-
-               if result:
-                    # Update existing record
-                    self.cursor.execute(
-                         "UPDATE users SET points = %s, log_json = %s WHERE guild_id = %s AND user_id = %s",
-                         (new_points, json.dumps(log_json), guild_id, user_id),
-                    )
-               else:
-                    # Create a new record
-                    self.cursor.execute(
-                         "INSERT INTO users (guild_id, user_id, status, points, log_json, notes) VALUES (%s, %s, %s, %s, %s, %s)",
-                         (guild_id, user_id, "active", points, json.dumps([log_entry]), ""),
-                    )
-               self.conn.commit()
+               # Buffered and group-committed with other hits, written straight through if the buffer is off
+               await self.bot.point_buffer.add(guild_id, user_id, points, log_entry)
           except Exception as e:
                print(f"Error updating user points: {e}")
                
-     def update_chat_words(self, guild_id, chat_words):
+     async def update_chat_words(self, guild_id, chat_words):
           """Update the chat_words column in the guild_settings table."""
           try:
-               self.cursor.execute(
-                    "UPDATE guild_settings SET chat_words = %s WHERE guild_id = %s",
-                    (json.dumps(chat_words), guild_id),
-               )
-               self.conn.commit()
+               try:
+                    await self.repository.set_chat_words(guild_id, chat_words)
+               finally:
+                    # After the write, so any read that could have seen the old list is discarded
+                    self.word_generations[guild_id] = self.word_generations.get(guild_id, 0) + 1
+               # Apply the change to the cached matcher in place instead of rebuilding it
+               matcher = self.word_cache.get(guild_id)
+               if matcher is not None:
+                    matcher.sync(chat_words)
+               else:
+                    self.word_cache.set(guild_id, self.matcher_class(chat_words))
           except Exception as e:
+               # Drop the cached copy so the next message reloads from the database
+               self.word_cache.pop(guild_id)
                print(f"Error updating chat_words: {e}")
 
      @app_commands.command(name="filter", description="Manage filtered words for the server.")
+     @is_moderator()
      async def filter(
           self,
           interaction: discord.Interaction,
@@ -114,12 +106,6 @@ class WordFilter(commands.Cog):
           word: str = None,
           points: int = None,
      ):
-          # Check if the user has permission to use this command
-          if not await self.has_permission(interaction):
-               await interaction.response.send_message(
-                    "You do not have permission to use this command.", ephemeral=True
-               )
-               return
           """
           Manage filtered words for the guild.
 
@@ -128,8 +114,6 @@ class WordFilter(commands.Cog):
           - word: the word to manage
           - points: the point value to associate (required for add/update)
           """
-          self.reconnect_database()
-
           guild_id = interaction.guild_id
 
           if action not in ["add", "remove", "update", "view"]:
@@ -146,7 +130,7 @@ class WordFilter(commands.Cog):
                return
 
           # Fetch the current chat words
-          chat_words = self.fetch_chat_words(guild_id)
+          chat_words = await self.fetch_chat_words(guild_id)
 
           if action == "view":
                if not chat_words:
@@ -175,7 +159,7 @@ class WordFilter(commands.Cog):
                     )
                     return
                chat_words[word] = points
-               self.update_chat_words(guild_id, chat_words)
+               await self.update_chat_words(guild_id, chat_words)
                await interaction.response.send_message(
                     f"Added `{word}` with {points} points to the filter list.",
                     ephemeral=True,
@@ -188,7 +172,7 @@ class WordFilter(commands.Cog):
                     )
                     return
                del chat_words[word]
-               self.update_chat_words(guild_id, chat_words)
+               await self.update_chat_words(guild_id, chat_words)
                await interaction.response.send_message(
                     f"Removed `{word}` from the filter list.", ephemeral=True,
                )
@@ -207,34 +191,38 @@ class WordFilter(commands.Cog):
                     )
                     return
                chat_words[word] = points
-               self.update_chat_words(guild_id, chat_words)
+               await self.update_chat_words(guild_id, chat_words)
                await interaction.response.send_message(
                     f"Updated `{word}` to {points} points in the filter list.",
                     ephemeral=True,
                )
 
      @commands.Cog.listener()
+     @LISTENER_LATENCY.time(listener="on_message")
      async def on_message(self, message):
           """Listener to detect filtered words in chat messages."""
           if message.author.bot:
                return
 
-          self.reconnect_database()
           guild_id = message.guild.id
-          chat_words = self.fetch_chat_words(guild_id)
-
-          detected_words = {
-               word: points for word, points in chat_words.items() if word in message.content
-          }
+          matcher = await self.get_matcher(guild_id)
+
+          matched_text = {}
+          if self.normalizer is not None:
+               normalized, offsets = await self.normalizer.normalize(message.content)
+               detected_words = {}
+               for word, (points, (start, end)) in matcher.find(normalized, offsets).items():
+                    detected_words[word] = points
+                    matched_text[word] = message.content[start:end]
+          else:
+               detected_words = matcher.find(message.content)
 
           if detected_words:
                total_points = sum(detected_words.values())
                for word, points in detected_words.items():
-                    self.update_user_points(guild_id, message.author.id, word, points)
+                    await self.update_user_points(guild_id, message.author.id, word, points, matched_text.get(word))
 
-               await message.channel.send(
-                    f"{message.author.mention}, you used prohibited words. {total_points} points have been added to your record."
-               )
+               self.notifier.add(message.channel, message.author, total_points)
 
 
 async def setup(bot):
@@ -0,0 +1,52 @@
+import discord
+import os
+import time
+from discord.ext import commands
+from discord import app_commands
+from utils.permissions import is_moderator
+from utils.transfer import export_data
+
+EXPORT_DIR = "datastores/exports"
+# Default Discord upload limit, larger exports stay on disk for the bot owner to collect
+UPLOAD_LIMIT = 25 * 1024 * 1024
+
+
+class GuildExport(commands.Cog):
+     def __init__(self, bot):
+          self.bot = bot
+
+     @app_commands.command(name="export", description="Export this server's moderation data as a compressed file")
+     @app_commands.choices(format=[
+          app_commands.Choice(name="JSON lines", value="jsonl"),
+          app_commands.Choice(name="CSV", value="csv"),
+     ])
+     @is_moderator()
+     async def export(self, interaction: discord.Interaction, format: str = "jsonl"):
+          # Exports include every member's record, so they are limited to administrators
+          if not interaction.user.guild_permissions.administrator:
+               await interaction.response.send_message("You need the Administrator permission to export data.", ephemeral=True)
+               return
+
+          await interaction.response.defer(ephemeral=True, thinking=True)
+          os.makedirs(EXPORT_DIR, exist_ok=True)
+          path = os.path.join(EXPORT_DIR, f"guild-{interaction.guild_id}-{int(time.time())}.{format}.gz")
+          try:
+               total = await export_data(self.bot.db, path, interaction.guild_id, format)
+          except Exception as e:
+               await interaction.followup.send(f"An error occurred: {e}", ephemeral=True)
+               return
+
+          if os.path.getsize(path) > UPLOAD_LIMIT:
+               await interaction.followup.send(
+                    f"Exported {total} records, the file is too large to upload and was saved as `{path}` on the bot host.",
+                    ephemeral=True,
+               )
+               return
+          await interaction.followup.send(
+               f"Exported {total} records.", file=discord.File(path, filename=os.path.basename(path)), ephemeral=True
+          )
+          os.remove(path)
+
+
+async def setup(bot):
+     await bot.add_cog(GuildExport(bot))
@@ -0,0 +1,56 @@
+from discord.ext import commands, tasks
+from utils.metrics import LISTENER_LATENCY
+
+
+class LogCompaction(commands.Cog):
+     def __init__(self, bot):
+          self.bot = bot
+          self.last_compaction = None
+          # The archive is shared, so only one cluster runs the job
+          if bot.cluster_id in (None, '0'):
+               self.compaction_loop.start()
+          # Every worker caches counts and log tails, so each one watches for compactions, including cron runs
+          self.invalidation_loop.change_interval(seconds=bot.config.get('infraction_log', {}).get('compaction_poll', 60))
+          self.invalidation_loop.start()
+
+     async def cog_unload(self):
+          self.compaction_loop.cancel()
+          self.invalidation_loop.cancel()
+
+     @tasks.loop(hours=24)
+     @LISTENER_LATENCY.time(listener="compaction_loop")
+     async def compaction_loop(self):
+          """Moves infraction log entries past their retention age into the compressed archive."""
+          try:
+               archived = await self.bot.infraction_log.compact()
+               if archived:
+                    # Counts and log tails may now include archived entries
+                    self.bot.repository.invalidate_all()
+                    self.last_compaction = await self.bot.infraction_log.last_compaction()
+               print(f"Archived {archived} infraction log entries")
+          except Exception as e:
+               print(f"Error in compaction_loop: {e}")
+
+     @tasks.loop(seconds=60)
+     async def invalidation_loop(self):
+          """Drops cached counts and log tails once a compaction run elsewhere has moved entries."""
+          try:
+               finished_at = await self.bot.infraction_log.last_compaction()
+          except Exception as e:
+               print(f"Error checking for compaction runs: {e}")
+               return
+          if self.last_compaction is not None and finished_at != self.last_compaction:
+               self.bot.repository.invalidate_all()
+          self.last_compaction = finished_at
+
+     @compaction_loop.before_loop
+     async def before_compaction_loop(self):
+          await self.bot.wait_until_ready()
+
+     @invalidation_loop.before_loop
+     async def before_invalidation_loop(self):
+          await self.bot.wait_until_ready()
+
+
+async def setup(bot):
+     await bot.add_cog(LogCompaction(bot))
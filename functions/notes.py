@@ -1,47 +1,16 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+from utils.permissions import is_moderator
 
 
 class ManageNotes(commands.Cog):
      def __init__(self, bot):
           self.bot = bot
-          self.conn = bot.db_connection
-          self.cursor = self.conn.cursor()
-
-     def reconnect_database(self):
-          """Reconnects to the database if needed."""
-          try:
-               self.conn.ping(reconnect=True, attempts=3, delay=5)
-          except Exception as e:
-               print(f"Error reconnecting to the database: {e}")
-
-     async def has_permission(self, interaction: discord.Interaction) -> bool:
-          """Check if the user is an admin or has the mod role from the database."""
-          guild_id = interaction.guild_id
-          user = interaction.user
-
-          # Check if the user is an admin
-          if user.guild_permissions.administrator:
-               return True
-
-          # Check if the user has the mod role
-          try:
-               self.cursor.execute(
-                    "SELECT mod_role_id FROM guild_settings WHERE guild_id = %s",
-                    (guild_id,),
-               )
-               result = self.cursor.fetchone()
-               if result:
-                    mod_role_id = result[0]
-                    mod_role = interaction.guild.get_role(mod_role_id)
-                    if mod_role and mod_role in user.roles:
-                         return True
-          except Exception as e:
-               print(f"Error checking permissions: {e}")
-          return False
+          self.repository = bot.repository
 
      @app_commands.command(name="notes", description="View or edit a user's notes in the database")
+     @is_moderator()
      async def notes(
           self,
           interaction: discord.Interaction,
@@ -57,26 +26,13 @@ class ManageNotes(commands.Cog):
           - user: The target user
           - new_notes: The new notes to set (required for "edit")
           """
-          self.reconnect_database()
-
-          # Check if the user has permission to use this command
-          if not await self.has_permission(interaction):
-               await interaction.response.send_message(
-                    "You do not have permission to use this command.", ephemeral=True
-               )
-               return
-
           guild_id = interaction.guild_id
           user_id = user.id
 
           if action.lower() == "view":
                # Fetch and display notes
                try:
-                    self.cursor.execute(
-                         "SELECT notes FROM users WHERE guild_id = %s AND user_id = %s",
-                         (guild_id, user_id),
-                    )
-                    result = self.cursor.fetchone()
+                    result = await self.repository.get_notes(guild_id, user_id)
 
                     if result:
                          notes = result[0]
@@ -102,11 +58,7 @@ class ManageNotes(commands.Cog):
 
                # Update notes
                try:
-                    self.cursor.execute(
-                         "UPDATE users SET notes = %s WHERE guild_id = %s AND user_id = %s",
-                         (new_notes, guild_id, user_id),
-                    )
-                    self.conn.commit()
+                    await self.repository.set_notes(guild_id, user_id, new_notes)
 
                     await interaction.response.send_message(
                          f"Successfully updated notes for {user.mention}.", ephemeral=True
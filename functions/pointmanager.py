@@ -1,152 +1,114 @@
 import discord
 from discord.ext import commands, tasks
-import json
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
+import time
+from utils.metrics import DECAY_CROSSED, DECAY_DURATION, DECAY_ROWS, LISTENER_LATENCY
+
+# Define the tiers and messages, lowest first
+TIERS = [
+     {"points": 300, "status": "flagged", "message": "You have incurred significant infractions. You are at risk of being banned once you reach 1000 points."},
+     {"points": 500, "status": "risking ban", "message": "You have incurred significant infractions. You are at risk of being banned once you reach 1000 points."},
+     {"points": 1000, "status": "banned", "message": "Due to repeated violations of the rules, you have been banned from the server."}
+]
+
+
+def tier_for(points):
+     """Returns the highest tier reached by the given points, or None."""
+     reached = None
+     for tier in TIERS:
+          if points >= tier["points"]:
+               reached = tier
+     return reached
+
 
 class PointDecay(commands.Cog):
      def __init__(self, bot):
           self.bot = bot
-          self.conn = bot.db_connection
-          self.cursor = self.conn.cursor()
-          self.default_points = 0
+          self.repository = bot.repository
+          self.point_decay_loop.change_interval(seconds=self.repository.decay_interval)
           self.point_decay_loop.start()  # Start the loop when the cog is loaded
 
-     def reconnect_database(self):
-          """Reconnects to the database if needed."""
-          try:
-               self.conn.ping(reconnect=True, attempts=3, delay=5)
-          except Exception as e:
-               print(f"Error reconnecting to the database: {e}")
-          try:
-               self.cursor.execute("SELECT 1")
-               result = self.cursor.fetchone()
-          except Exception as e:
-               print(f"Error: Database connection failed: {e}")
-
-     async def send_warning(self, user_id, guild_id, points, log_json):
-          """Send a warning message to a user based on their points."""
-          
-          # Define the tiers and messages
-          tiers = [
-               {"points": 300, "status": "flagged", "message": "You have incurred significant infractions. You are at risk of being banned once you reach 1000 points."},
-               {"points": 500, "status": "risking ban", "message": "You have incurred significant infractions. You are at risk of being banned once you reach 1000 points."},
-               {"points": 1000, "status": "banned", "message": "Due to repeated violations of the rules, you have been banned from the server."}
-          ]
-          
-          user = await self.bot.fetch_user(user_id)
+     async def send_warning(self, user_id, guild_id, points):
+          """Send a warning message to a user who has just entered a new tier."""
+          tier = tier_for(points)
+          if tier is None:
+               return
+
+          # Prefer the cached user and only hit the API when it isn't cached
+          user = self.bot.get_user(user_id)
+          if user is None:
+               try:
+                    user = await self.bot.fetch_user(user_id)
+               except discord.errors.NotFound:
+                    user = None
           if user:
-               for tier in tiers:
-                    if points >= tier["points"]:
-                         # Check if the message has already been sent for this tier
-                         if "message_sent" not in log_json or log_json["message_sent"] != tier["status"]:
-                              formatted_log = "\n".join(
-                                   [
-                                        f"• **Action**: {entry.get('action', 'N/A')} | **Word**: {entry.get('word', 'N/A')} | **Points Added**: {entry.get('points_added', 'N/A')} | **Time**: {entry.get('timestamp', 'N/A')}"
-                                        for entry in log_json.get("log_entries", [])
-                                   ]
-                              )
-                              message = (
-                                   f"{tier['message']}\n\n**Current Points**: {points}\n\n"
-                                   f"**Infraction Log:**\n{formatted_log or 'No infractions recorded.'}"
-                              )
-                              try:
-                                   await user.send(message)
-                                   print(f"Sent message to {user_id} in guild {guild_id}: {message}")
-
-                                   # Add a note to log_json indicating the message has been sent
-                                   log_json["message_sent"] = tier["status"]
-
-                              except discord.errors.Forbidden:
-                                   print(f"Could not send DM to user {user_id} in guild {guild_id}. They have DMs disabled.")
-
-                         # If points are 1000 or more, ban the user
-                         if points >= 1000:
-                              guild = self.bot.get_guild(guild_id)
-                              if guild:
-                                   member = guild.get_member(user_id)
-                                   if member:
-                                        await member.ban(reason="Exceeded maximum infractions (1000 points).")
-                                        print(f"Banned user {user_id} in guild {guild_id} due to exceeding infraction points.")
-                                        
-                                        # Add a note to log_json indicating the user has been banned
-                                        log_json["ban_message"] = "User banned due to exceeding infraction points."
-
-                         break
-
-          # Update log_json in the database (if there are any changes)
-          return log_json
+               log_entries = await self.repository.recent_entries(guild_id, user_id)
+               formatted_log = "\n".join(
+                    [
+                         f"• **Action**: {entry.get('action', 'N/A')} | **Word**: {entry.get('word', 'N/A')} | **Points Added**: {entry.get('points_added', 'N/A')} | **Time**: {entry.get('timestamp', 'N/A')}"
+                         for entry in log_entries
+                    ]
+               )
+               message = (
+                    f"{tier['message']}\n\n**Current Points**: {points}\n\n"
+                    f"**Infraction Log:**\n{formatted_log or 'No infractions recorded.'}"
+               )
+               try:
+                    await self.bot.dispatcher.throttle("dm")
+                    await user.send(message)
+                    print(f"Sent message to {user_id} in guild {guild_id}: {message}")
+               except discord.errors.Forbidden:
+                    print(f"Could not send DM to user {user_id} in guild {guild_id}. They have DMs disabled.")
+
+          # If points are 1000 or more, ban the user
+          if points >= 1000:
+               guild = self.bot.get_guild(guild_id)
+               if guild:
+                    member = guild.get_member(user_id)
+                    if member:
+                         await self.bot.dispatcher.throttle(f"ban:{guild_id}")
+                         await member.ban(reason="Exceeded maximum infractions (1000 points).")
+                         self.bot.ban_index.mark(guild_id, user_id, True)
+                         print(f"Banned user {user_id} in guild {guild_id} due to exceeding infraction points.")
 
      @tasks.loop(minutes=15)
+     @LISTENER_LATENCY.time(listener="point_decay_loop")
      async def point_decay_loop(self):
-          """Loop that runs every hour on the hour and reduces points for all users by 10."""
-          
-          # Define the tiers and messages
-          tiers = [
-               {"points": 300, "status": "flagged", "message": "You have incurred significant infractions. You are at risk of being banned once you reach 1000 points."},
-               {"points": 500, "status": "risking ban", "message": "You have incurred significant infractions. You are at risk of being banned once you reach 1000 points."},
-               {"points": 1000, "status": "banned", "message": "Due to repeated violations of the rules, you have been banned from the server."}
-          ]
-          
+          """Loop that runs every decay tick and reduces points for all users, or sweeps tiers in lazy mode."""
           try:
                current_time = datetime.now().isoformat()
                print(f"Point decay started at {current_time}")
 
-               # Reconnect to the database before running the operation
-               self.reconnect_database()
-
-               # Fetch all users' current points
-               self.cursor.execute("SELECT guild_id, user_id, points, log_json, status FROM users")
-               users = self.cursor.fetchall()
-
-               # Loop through all users and reduce their points by 10 if possible
-               for guild_id, user_id, current_points, log_json, status in users:
-                    new_points = max(0, current_points - 10)  # Ensure points don't go below 0
-                    if new_points != current_points:
-                         # Update the user's points in the database
-                         self.cursor.execute(
-                         "UPDATE users SET points = %s WHERE guild_id = %s AND user_id = %s",
-                         (new_points, guild_id, user_id)
-                         )
-                         print(f"Reduced points for user {user_id} in guild {guild_id}: {current_points} -> {new_points}")
-
-                         # Load the log data if available
-                         log_json = json.loads(log_json) if log_json else {}
-
-                         # Check for warning thresholds after updating points
-                         log_json = await self.send_warning(user_id, guild_id, new_points, log_json)
-
-                         # Update status based on points thresholds
-                         new_status = "active"  # Default status for users under 300 points
-                         for tier in tiers:
-                              if new_points >= tier["points"]:
-                                   new_status = tier["status"]
-                         if new_status != status:
-                              self.cursor.execute(
-                                   "UPDATE users SET status = %s WHERE guild_id = %s AND user_id = %s",
-                                   (new_status, guild_id, user_id)
-                              )
-                         print(f"Updated status for user {user_id} in guild {guild_id}: {status} -> {new_status}")
-
-                         # Update log_json in the database if modified
-                         self.cursor.execute(
-                         "UPDATE users SET log_json = %s WHERE guild_id = %s AND user_id = %s",
-                         (json.dumps(log_json), guild_id, user_id)
-                         )
-
-               # Commit changes
-               self.conn.commit()
+               # Cluster workers only decay guilds on their own shards
+               start = time.perf_counter()
+               if self.repository.lazy_decay:
+                    # Points decay on read, so only rows whose tier changed are touched here
+                    decayed, crossed = await self.repository.sweep_tiers(
+                         TIERS, shard_count=self.bot.shard_count, shard_ids=self.bot.shard_ids
+                    )
+               else:
+                    decayed, crossed = await self.repository.decay(
+                         self.repository.decay_points, TIERS, shard_count=self.bot.shard_count, shard_ids=self.bot.shard_ids
+                    )
+               DECAY_DURATION.observe(time.perf_counter() - start)
+               DECAY_ROWS.inc(decayed)
+               DECAY_CROSSED.inc(len(crossed))
+               print(f"Reduced points for {decayed} users, {len(crossed)} entered a new tier")
+
+               # Queue warnings and bans for users who crossed a tier in this tick
+               for guild_id, user_id, points in crossed:
+                    self.bot.dispatcher.submit(partial(self.send_warning, user_id, guild_id, points))
 
           except Exception as e:
                print(f"Error in point_decay_loop: {e}")
 
      @point_decay_loop.before_loop
      async def before_point_decay_loop(self):
-          """Ensure that the loop runs at the top of the hour."""
-          from datetime import datetime, timedelta
-          now = datetime.now()
-          # Calculate the time until the next hour
-          next_quarter = now + timedelta(minutes=15 - now.minute % 15, seconds=-now.second, microseconds=-now.microsecond)
-          await discord.utils.sleep_until(next_quarter)
+          """Align the loop to the next multiple of the decay interval, so every shard ticks together."""
+          interval = self.repository.decay_interval
+          next_tick = (int(time.time()) // interval + 1) * interval
+          await discord.utils.sleep_until(datetime.fromtimestamp(next_tick, tz=timezone.utc))
           print("Point decay loop will start now.")
 
 async def setup(bot):
@@ -0,0 +1,76 @@
+import discord
+from discord.ext import commands
+from datetime import datetime, timedelta
+from functools import partial
+from utils.metrics import LISTENER_LATENCY, RAID_TRIPS
+from utils.raid import RaidDetector
+
+
+class RaidGuard(commands.Cog):
+     def __init__(self, bot):
+          self.bot = bot
+          self.repository = bot.repository
+          self.config = bot.config.get('raid', {})
+          # Off unless a guild's operators opt in, since a tripped detector assigns points and timeouts
+          self.enabled = self.config.get('enabled', False)
+          # Counters live in memory, the database is only touched once a threshold trips
+          self.detector = RaidDetector(self.config)
+
+     async def apply_action(self, guild, member_ids, action, kind, note):
+          """Applies a configured raid action: points through the infraction path, then optional timeouts."""
+          points = action.get('points', 0)
+          if points:
+               log_entry = {
+                    "action": kind,
+                    "action_by_name": "Bot",
+                    "points_added": points,
+                    "note": action.get('note', note),
+                    "timestamp": datetime.now().isoformat(),
+               }
+               await self.repository.add_points_bulk(guild.id, member_ids, points, log_entry)
+
+          timeout_minutes = action.get('timeout_minutes', 0)
+          if timeout_minutes:
+               until = timedelta(minutes=timeout_minutes)
+               for member_id in member_ids:
+                    member = guild.get_member(member_id)
+                    if member is None:
+                         continue
+                    try:
+                         await self.bot.dispatcher.throttle(f"timeout:{guild.id}")
+                         await member.timeout(until, reason=note)
+                    except discord.errors.Forbidden:
+                         print(f"Missing permission to time out user {member_id} in guild {guild.id}.")
+
+     @commands.Cog.listener()
+     @LISTENER_LATENCY.time(listener="raid_member_join")
+     async def on_member_join(self, member):
+          if not self.enabled or member.bot:
+               return
+          flagged = self.detector.record_join(member.guild.id, member.id)
+          if not flagged:
+               return
+          RAID_TRIPS.inc(kind="join")
+          print(f"Join raid in guild {member.guild.id}, acting on {len(flagged)} members")
+          self.bot.dispatcher.submit(partial(
+               self.apply_action, member.guild, flagged, self.config.get('join_action', {}),
+               "raid_join", "Joined during a detected raid",
+          ))
+
+     @commands.Cog.listener()
+     @LISTENER_LATENCY.time(listener="raid_message")
+     async def on_message(self, message):
+          if not self.enabled or message.author.bot or message.guild is None:
+               return
+          if not self.detector.record_message(message.guild.id, message.author.id):
+               return
+          RAID_TRIPS.inc(kind="message")
+          print(f"Message burst from user {message.author.id} in guild {message.guild.id}")
+          self.bot.dispatcher.submit(partial(
+               self.apply_action, message.guild, [message.author.id], self.config.get('message_action', {}),
+               "message_burst", "Sent messages faster than the configured rate",
+          ))
+
+
+async def setup(bot):
+     await bot.add_cog(RaidGuard(bot))
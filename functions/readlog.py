@@ -1,88 +1,84 @@
 import discord
+import io
 import json
+import re
 from discord.ext import commands
 from discord import app_commands
+from utils.notifications import MESSAGE_LIMIT
+from utils.permissions import is_moderator
 
-class ViewInfractions(commands.Cog):
-     def __init__(self, bot):
+# Long notes are shortened so a full page always fits in one message
+NOTE_LIMIT = 200
+
+
+def format_entry(entry):
+     note = entry['note'] or ""
+     if len(note) > NOTE_LIMIT:
+          note = note[:NOTE_LIMIT - 3] + "..."
+     return (
+          f"**Action**: {entry['action']}\n**Action By**: {entry['action_by_name']}\n**Points Added**: {entry['points_added']}\n"
+          f"**Note**: {note}\n**Timestamp**: {entry['timestamp']}\n"
+     )
+
+
+class InfractionPages(discord.ui.View):
+     """Newest-first pages of a user's infraction log, loaded one page at a time."""
+
+     def __init__(self, bot, author_id, user, header, total):
+          super().__init__(timeout=180)
           self.bot = bot
-          self.conn = bot.db_connection
-          self.cursor = self.conn.cursor()
+          self.author_id = author_id
+          self.user = user
+          self.header = header
+          self.total = total
+          self.per_page = bot.infraction_log.page_size
+          self.page = 0
+          self.pages = max(1, -(-total // self.per_page))
 
-     def reconnect_database(self):
-          """Reconnects to the database if needed."""
-          try:
-               self.conn.ping(reconnect=True, attempts=3, delay=5)
-          except Exception as e:
-               print(f"Error reconnecting to the database: {e}")
-          try:
-               self.cursor.execute("SELECT 1")
-               result = self.cursor.fetchone()
-          except Exception as e:
-               print(f"Error: Database connection failed: {e}")
+     async def render(self, guild_id):
+          """Builds the message for the current page and updates the button states."""
+          entries = await self.bot.infraction_log.page(guild_id, self.user.id, self.page, self.per_page)
+          body = "\n".join(format_entry(entry) for entry in entries) or "No logs available"
+          self.previous_page.disabled = self.page == 0
+          self.next_page.disabled = self.page >= self.pages - 1
+          content = f"{self.header}\nLog Entries (page {self.page + 1}/{self.pages}, newest first):\n{body}"
+          return content[:MESSAGE_LIMIT]
 
-     async def has_permission(self, interaction: discord.Interaction) -> bool:
-          """Check if the user is an admin or has the mod role from the database."""
-          guild_id = interaction.guild_id
-          user = interaction.user
+     async def interaction_check(self, interaction: discord.Interaction) -> bool:
+          # Only the moderator who ran /view can page through it
+          return interaction.user.id == self.author_id
 
-          # Check if the user is an admin
-          if user.guild_permissions.administrator:
-               return True
+     @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+     async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+          self.page = max(0, self.page - 1)
+          await interaction.response.edit_message(content=await self.render(interaction.guild_id), view=self)
 
-          # Check if the user has the mod role
-          try:
-               self.cursor.execute(
-                    "SELECT mod_role_id FROM guild_settings WHERE guild_id = %s",
-                    (guild_id,),
-               )
-               result = self.cursor.fetchone()
-               if result:
-                    mod_role_id = result[0]
-                    mod_role = interaction.guild.get_role(mod_role_id)
-                    if mod_role and mod_role in user.roles:
-                         return True
-          except Exception as e:
-               print(f"Error checking permissions: {e}")
-          return False
-     
-     @app_commands.command(name="view", description="View a user's points, status, notes, and log_json from the database")
-     async def view(self, interaction: discord.Interaction, user: discord.Member):
-          self.reconnect_database()
+     @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+     async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+          self.page = min(self.pages - 1, self.page + 1)
+          await interaction.response.edit_message(content=await self.render(interaction.guild_id), view=self)
 
-          # Check if the user has permission to use this command
-          if not await self.has_permission(interaction):
-               await interaction.response.send_message(
-                    "You do not have permission to use this command.", ephemeral=True
-               )
-               return
-          
+
+class ViewInfractions(commands.Cog):
+     def __init__(self, bot):
+          self.bot = bot
+          self.repository = bot.repository
+
+     @app_commands.command(name="view", description="View a user's points, status, notes, and infraction log from the database")
+     @is_moderator()
+     async def view(self, interaction: discord.Interaction, user: discord.Member):
           try:
                guild_id = interaction.guild_id
                user_id = user.id
 
-               # Fetch points, status, notes, and log_json for the user
+               # Fetch points, status and notes plus the log size for the summary header
                try:
-                    self.cursor.execute(
-                         "SELECT points, status, notes, log_json FROM users WHERE guild_id = %s AND user_id = %s",
-                         (guild_id, user_id)
-                    )
-                    result = self.cursor.fetchone()
+                    result = await self.repository.get_user(guild_id, user_id)
 
                     if result:
-                         current_points, status, notes, log_json = result
-
-                         if log_json is None:
-                              log_json = "No logs available"
-                         else:
-                         # Parse the JSON and prepare it for display in a table format
-                              try:
-                                   log_entries = json.loads(log_json)
-                                   formatted_log_json = "\n".join(
-                                        [f"**Action By**: {entry['action_by_name']}\n**Points Added**: {entry['points_added']}\n**Note**: {entry['note']}\n**Timestamp**: {entry['timestamp']}\n" for entry in log_entries]
-                                   )
-                              except json.JSONDecodeError:
-                                   formatted_log_json = "Failed to decode log_json"
+                         current_points, status, notes = result
+                         total = await self.repository.count_entries(guild_id, user_id)
+                         archived, _ = await self.bot.infraction_log.archive_summary(guild_id, user_id)
 
                          if notes is None:
                               notes = "No notes available"
@@ -90,24 +86,56 @@ class ViewInfractions(commands.Cog):
                          current_points = 0
                          status = "No records found"
                          notes = "No notes available"
-                         formatted_log_json = "No logs available"
+                         total = 0
+                         archived = 0
 
                except Exception as e:
                     await interaction.response.send_message(f"Error while fetching data: {e}", ephemeral=True)
                     return
 
-               # Send points, status, notes, and log_json to the user
-               await interaction.response.send_message(
+               header = (
                     f"**{user.mention}'s Current Info:**\n"
                     f"Points: {current_points}\n"
                     f"Status: {status}\n"
                     f"Notes: {notes}\n"
-                    f"Log Entries:\n{formatted_log_json}",
-                    ephemeral=True
-               )
+                    f"Entries: {total}" + (f" ({archived} older entries archived, see /view_archive)" if archived else "")
+               )[:MESSAGE_LIMIT // 2]
+
+               if not total:
+                    await interaction.response.send_message(f"{header}\nLog Entries:\nNo logs available", ephemeral=True)
+                    return
+
+               # Only the first page is fetched now, the buttons load the rest on demand
+               pages = InfractionPages(self.bot, interaction.user.id, user, header, total)
+               await interaction.response.send_message(await pages.render(guild_id), view=pages, ephemeral=True)
 
           except Exception as e:
                await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
 
+     @app_commands.command(name="view_archive", description="Download a user's archived infraction entries")
+     @app_commands.describe(month="Only this month, as YYYY-MM")
+     @is_moderator()
+     async def view_archive(self, interaction: discord.Interaction, user: discord.Member, month: str = None):
+          if month and not re.fullmatch(r"\d{4}-\d{2}", month):
+               await interaction.response.send_message("Month must look like 2024-01.", ephemeral=True)
+               return
+          await interaction.response.defer(ephemeral=True, thinking=True)
+          try:
+               entries = await self.bot.infraction_log.archived(interaction.guild_id, user.id, month)
+          except Exception as e:
+               await interaction.followup.send(f"Error while fetching the archive: {e}", ephemeral=True)
+               return
+          if not entries:
+               await interaction.followup.send(f"No archived entries for {user.mention}.", ephemeral=True)
+               return
+          # Archives can be far longer than a message, so they are sent as a JSON lines attachment
+          data = "\n".join(json.dumps(entry) for entry in entries).encode("utf-8")
+          name = f"infractions-{user.id}-{month or 'all'}.jsonl"
+          await interaction.followup.send(
+               f"{len(entries)} archived entries for {user.mention}.",
+               file=discord.File(io.BytesIO(data), filename=name),
+               ephemeral=True,
+          )
+
 async def setup(bot):
      await bot.add_cog(ViewInfractions(bot))
@@ -0,0 +1,29 @@
+import discord
+from utils.cache import LRUCache
+
+
+class BanIndex:
+    """Locally maintained per-guild ban state so single-user checks never page through guild.bans()."""
+
+    def __init__(self, config=None):
+        config = config or {}
+        # Entries expire so a missed ban or unban event only leaves the index wrong until the next lookup
+        self.cache = LRUCache(
+            config.get('ban_index_size', 100000), ttl=config.get('ban_index_ttl', 3600)
+        )  # (guild_id, user_id) -> banned
+
+    def mark(self, guild_id, user_id, banned):
+        """Records a ban or unban seen through an event or performed by the bot."""
+        self.cache.set((guild_id, user_id), banned)
+
+    async def is_banned(self, guild: discord.Guild, user_id):
+        """Returns whether the user is banned, asking Discord for just that user on an index miss."""
+        banned = self.cache.get((guild.id, user_id))
+        if banned is None:
+            try:
+                await guild.fetch_ban(discord.Object(id=user_id))
+                banned = True
+            except discord.NotFound:
+                banned = False
+            self.mark(guild.id, user_id, banned)
+        return banned
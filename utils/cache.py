@@ -0,0 +1,114 @@
+import sys
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry once full, with an optional TTL."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()  # key -> (value, expires_at)
+
+    def get(self, key, default=None):
+        """Returns the cached value and marks it as recently used."""
+        try:
+            value, expires_at = self.data[key]
+        except KeyError:
+            return default
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return default
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """Stores a value, evicting the oldest entry if the cache is full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.data[key] = (value, expires_at)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Removes a key from the cache."""
+        entry = self.data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        self.data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self.data)
+
+
+def approximate_size(value):
+    """Rough deep size of a cached value, counting containers and their contents."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class MemoryBoundedCache(LRUCache):
+    """LRUCache that also evicts once its values pass maxbytes, and counts hits, misses and evictions."""
+
+    def __init__(self, maxsize=1024, ttl=None, maxbytes=None):
+        super().__init__(maxsize, ttl)
+        self.maxbytes = maxbytes
+        self.bytes = 0
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _forget(self, key):
+        """Drops the size of an entry the base class removed, e.g. on TTL expiry."""
+        if key not in self.data:
+            self.bytes -= self.sizes.pop(key, 0)
+
+    def get(self, key, default=None):
+        value = super().get(key, _MISSING)
+        if value is _MISSING:
+            self._forget(key)
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        size = approximate_size(value)
+        self.bytes += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.data[key] = (value, expires_at)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes and self.data):
+            evicted, _ = self.data.popitem(last=False)
+            self.bytes -= self.sizes.pop(evicted, 0)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        value = super().pop(key, default)
+        self.bytes -= self.sizes.pop(key, 0)
+        return value
+
+    def clear(self):
+        super().clear()
+        self.sizes.clear()
+        self.bytes = 0
+
+    def __contains__(self, key):
+        # Membership checks don't count towards the hit rate
+        found = super().get(key, _MISSING) is not _MISSING
+        self._forget(key)
+        return found
+
+
+_MISSING = object()
@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+
+HASH_FILE = os.path.join("datastores", "command_hashes.json")
+
+
+def command_payload(tree, command):
+    # Newer discord.py versions need the tree to build the payload
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        return command.to_dict()
+
+
+def command_signature(tree, guild=None):
+    """Returns a stable hash of the app commands registered for the guild, or globally."""
+    payloads = sorted(
+        (command_payload(tree, command) for command in tree.get_commands(guild=guild)),
+        key=lambda payload: (payload.get('type', 1), payload['name']),
+    )
+    encoded = json.dumps(payloads, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def load_hashes():
+    try:
+        with open(HASH_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_hashes(hashes):
+    temp_file = f"{HASH_FILE}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(hashes, f, indent=4)
+    os.replace(temp_file, HASH_FILE)
+
+
+async def sync_if_changed(tree, guild=None):
+    """Syncs the command tree only when its signature differs from the last successful sync."""
+    key = str(guild.id) if guild else "global"
+    signature = command_signature(tree, guild=guild)
+    hashes = load_hashes()
+    if hashes.get(key) == signature:
+        print(f"Command tree for {key} is unchanged, skipping sync.")
+        return False
+    await tree.sync(guild=guild)
+    hashes[key] = signature
+    save_hashes(hashes)
+    print(f"Synced command tree for {key}.")
+    return True
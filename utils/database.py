@@ -0,0 +1,277 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils.metrics import DB_LATENCY, DB_QUERIES, statement_label
+
+# Store datetimes the same way MySQL returns them as text
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+
+
+class BaseDatabase:
+    """Runs blocking driver calls on worker threads and exposes awaitable query helpers.
+
+    Queries are written with the MySQL %s paramstyle, backends translate as needed.
+    """
+
+    dialect = None
+    # Whether an open stream keeps a pooled connection to itself
+    stream_holds_connection = True
+
+    def __init__(self, pool_size, acquire_timeout):
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        # One worker per connection so a query never waits on the pool inside a thread
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='db')
+        self.semaphore = asyncio.Semaphore(self.pool_size)
+
+    def _call(self, func):
+        raise NotImplementedError
+
+    def _call_transaction(self, func):
+        raise NotImplementedError
+
+    def _open_stream(self, query, params):
+        """Executes a query on an unbuffered cursor, returning (cursor, release)."""
+        raise NotImplementedError
+
+    async def run(self, func, transaction=False, label=None):
+        """Awaits func(cursor) on a pooled connection, bounded by the acquire timeout."""
+        label = label or getattr(func, '__name__', 'transaction')
+        DB_QUERIES.inc(statement=label)
+        start = time.perf_counter()
+        try:
+            return await self._run(func, transaction)
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - start, statement=label)
+
+    async def _run(self, func, transaction):
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+        try:
+            loop = asyncio.get_running_loop()
+            target = self._call_transaction if transaction else self._call
+            return await loop.run_in_executor(self.executor, target, func)
+        finally:
+            self.semaphore.release()
+
+    async def fetchone(self, query, params=None):
+        """Executes a query and returns the first row."""
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchone()
+        return await self.run(work, label=statement_label(query))
+
+    async def fetchall(self, query, params=None):
+        """Executes a query and returns every row."""
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        return await self.run(work, label=statement_label(query))
+
+    async def execute(self, query, params=None):
+        """Executes a write statement and returns the affected row count."""
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.rowcount
+        return await self.run(work, label=statement_label(query))
+
+    async def executemany(self, query, seq_params):
+        """Executes a write statement for every parameter set in one transaction."""
+        def work(cursor):
+            cursor.executemany(query, seq_params)
+            return cursor.rowcount
+        return await self.run(work, transaction=True, label=statement_label(query))
+
+    async def transaction(self, func, label=None):
+        """Runs func(cursor) as one transaction and returns its result."""
+        return await self.run(func, transaction=True, label=label)
+
+    async def stream(self, query, params=None, batch_size=1000):
+        """Yields lists of up to batch_size rows from a server-side cursor, so memory stays flat for any result size."""
+        DB_QUERIES.inc(statement=statement_label(query))
+        loop = asyncio.get_running_loop()
+        if self.stream_holds_connection:
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=self.acquire_timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+        try:
+            cursor, release = await loop.run_in_executor(self.executor, self._open_stream, query, params)
+            try:
+                while True:
+                    rows = await loop.run_in_executor(self.executor, cursor.fetchmany, batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                await loop.run_in_executor(self.executor, release)
+        finally:
+            if self.stream_holds_connection:
+                self.semaphore.release()
+
+    def close(self):
+        """Stops the worker threads once in-flight queries finish."""
+        self.executor.shutdown(wait=True)
+
+
+class Database(BaseDatabase):
+    """Pooled MySQL access that keeps blocking driver calls off the event loop."""
+
+    dialect = "mysql"
+
+    def __init__(self, db_config):
+        from mysql.connector import pooling
+
+        super().__init__(db_config.get('pool_size', 5), db_config.get('acquire_timeout', 10))
+        # Server-side prepared statements, reused for every execution on the cursor
+        self.prepared = db_config.get('prepared_statements', False)
+        self.pool = pooling.MySQLConnectionPool(
+            pool_name=db_config.get('pool_name', 'progressive_mod'),
+            pool_size=self.pool_size,
+            host=db_config['host'],
+            user=db_config['user'],
+            password=db_config['password'],
+            database=db_config['database'],
+            autocommit=True,
+            connection_timeout=db_config.get('connection_timeout', 6000)
+        )
+
+    def _call(self, func):
+        """Runs func(cursor) on a pooled connection inside a worker thread."""
+        conn = self.pool.get_connection()
+        try:
+            cursor = conn.cursor(prepared=self.prepared)
+            try:
+                return func(cursor)
+            finally:
+                cursor.close()
+        finally:
+            conn.close()  # Returns the connection to the pool
+
+    def _call_transaction(self, func):
+        """Runs func(cursor) inside a single transaction, rolling back on error."""
+        conn = self.pool.get_connection()
+        try:
+            conn.start_transaction()
+            cursor = conn.cursor(prepared=self.prepared)
+            try:
+                result = func(cursor)
+                conn.commit()
+                return result
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def _open_stream(self, query, params):
+        conn = self.pool.get_connection()
+        # Unbuffered, rows are read off the socket as fetchmany asks for them
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(query, params)
+        except Exception:
+            cursor.close()
+            conn.close()
+            raise
+
+        def release():
+            try:
+                conn.consume_results()  # Drains rows left unread if the consumer stopped early
+                cursor.close()
+            finally:
+                conn.close()
+        return cursor, release
+
+
+class SQLiteCursor:
+    """Wraps a sqlite3 cursor so queries written with %s placeholders run unchanged."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=None):
+        self.cursor.execute(query.replace("%s", "?"), params or ())
+
+    def executemany(self, query, seq_params):
+        self.cursor.executemany(query.replace("%s", "?"), seq_params)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def close(self):
+        self.cursor.close()
+
+
+class SQLiteDatabase(BaseDatabase):
+    """Single-file (or in-memory) SQLite backend for local runs, tests and benchmarks."""
+
+    dialect = "sqlite"
+    cursor_class = SQLiteCursor
+    # Streams share the single connection, sqlite3 steps the statement as rows are fetched
+    stream_holds_connection = False
+
+    def __init__(self, db_config):
+        # SQLite allows one writer at a time, so all access goes through a single thread
+        super().__init__(1, db_config.get('acquire_timeout', 10))
+        self.conn = sqlite3.connect(db_config.get('path', 'datastores/progressive.db'), check_same_thread=False, isolation_level=None)
+
+    def _call(self, func):
+        cursor = self.cursor_class(self.conn.cursor())
+        try:
+            return func(cursor)
+        finally:
+            cursor.close()
+
+    def _call_transaction(self, func):
+        cursor = self.cursor_class(self.conn.cursor())
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(cursor)
+                self.conn.execute("COMMIT")
+                return result
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        finally:
+            cursor.close()
+
+    def _open_stream(self, query, params):
+        cursor = self.cursor_class(self.conn.cursor())
+        cursor.execute(query, params)
+        return cursor, cursor.close
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+
+def create_database(db_config):
+    """Builds the backend selected by the database.backend config key."""
+    backend = db_config.get('backend', 'mysql')
+    if backend == 'mysql':
+        return Database(db_config)
+    if backend == 'sqlite':
+        return SQLiteDatabase(db_config)
+    raise ValueError(f"Unknown database backend: {backend}")
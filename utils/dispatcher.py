@@ -0,0 +1,94 @@
+import asyncio
+import time
+from utils.cache import LRUCache
+
+
+class RouteLimiter:
+    """Token bucket that spaces out calls made on one Discord route."""
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class ActionDispatcher:
+    """Bounded-concurrency queue for outbound Discord actions such as warning DMs and bans."""
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.concurrency = config.get('concurrency', 5)
+        self.queue = asyncio.Queue(maxsize=config.get('max_queue', 10000))
+        self.route_config = config.get('routes', {})
+        # Longest stop() waits for queued actions; cluster.py kills a worker 30 seconds after SIGTERM
+        self.drain_timeout = config.get('drain_timeout', 10)
+        # Buckets for the least recently used routes are evicted, a recreated bucket starts full like an idle one
+        self.limiters = LRUCache(config.get('max_limiters', 10000))
+        self.workers = []
+
+    def start(self):
+        """Starts the worker tasks, must be called from a running event loop."""
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        """Waits up to drain_timeout for queued actions to finish, then stops the workers and drops the rest."""
+        if not self.workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Outbound actions did not drain within {self.drain_timeout}s, dropping {self.queue.qsize()} queued actions.")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, action):
+        """Queues a coroutine function to run on a worker. Returns False if the queue is full."""
+        try:
+            self.queue.put_nowait(action)
+            return True
+        except asyncio.QueueFull:
+            print("Outbound action queue is full, dropping action.")
+            return False
+
+    async def throttle(self, route):
+        """Waits until the route's rate limit allows another call.
+
+        Routes may carry a major parameter (e.g. "ban:<guild_id>"), each gets its own bucket
+        configured by the part before the colon.
+        """
+        limiter = self.limiters.get(route)
+        if limiter is None:
+            limits = self.route_config.get(route.split(':', 1)[0], {})
+            limiter = RouteLimiter(limits.get('rate', 5), limits.get('per', 5))
+            self.limiters.set(route, limiter)
+        await limiter.acquire()
+
+    async def _worker(self):
+        while True:
+            action = await self.queue.get()
+            try:
+                await action()
+            except Exception as e:
+                print(f"Error running outbound action: {e}")
+            finally:
+                self.queue.task_done()
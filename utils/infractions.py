@@ -0,0 +1,322 @@
+import asyncio
+import json
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from utils.database import create_database
+from utils.migrations import applied_versions, apply_migrations
+
+# Appends one entry to the legacy users.log_json array without reading it back into Python
+APPEND_LOG_JSON = {
+    "mysql": "UPDATE users SET log_json = JSON_ARRAY_APPEND(COALESCE(log_json, JSON_ARRAY()), '$', CAST(%s AS JSON)) "
+             "WHERE guild_id = %s AND user_id = %s",
+    "sqlite": "UPDATE users SET log_json = json_insert(COALESCE(log_json, '[]'), '$[#]', json(%s)) "
+              "WHERE guild_id = %s AND user_id = %s",
+}
+
+# Columns row_entry reads back, in order; created_at stays seventh so SELECT_EXPIRED can find it at row[9]
+ENTRY_COLUMNS = "action, action_by, action_by_name, word, points_added, note, created_at, matched_text"
+
+SELECT_EXPIRED = (
+    f"SELECT id, guild_id, user_id, {ENTRY_COLUMNS} "
+    "FROM infraction_log WHERE created_at < %s ORDER BY id LIMIT %s"
+)
+SELECT_ARCHIVE_MONTH = (
+    "SELECT entries, points_added, data FROM infraction_archive WHERE guild_id = %s AND user_id = %s AND month = %s"
+)
+UPSERT_ARCHIVE_MONTH = {
+    "mysql": "INSERT INTO infraction_archive (guild_id, user_id, month, entries, points_added, data) "
+             "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+             "entries = VALUES(entries), points_added = VALUES(points_added), data = VALUES(data)",
+    "sqlite": "INSERT INTO infraction_archive (guild_id, user_id, month, entries, points_added, data) "
+              "VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT (guild_id, user_id, month) DO UPDATE SET "
+              "entries = excluded.entries, points_added = excluded.points_added, data = excluded.data",
+}
+JSON_LENGTH = {"mysql": "JSON_LENGTH(log_json)", "sqlite": "json_array_length(log_json)"}
+SELECT_JOB_RUN = "SELECT finished_at FROM job_runs WHERE job = %s"
+UPSERT_JOB_RUN = {
+    "mysql": "INSERT INTO job_runs (job, finished_at) VALUES (%s, %s) ON DUPLICATE KEY UPDATE finished_at = VALUES(finished_at)",
+    "sqlite": "INSERT INTO job_runs (job, finished_at) VALUES (%s, %s) "
+              "ON CONFLICT (job) DO UPDATE SET finished_at = excluded.finished_at",
+}
+# Migration that copies users.log_json into infraction_log; once it has run the blobs are safe to trim
+BACKFILL_MIGRATION = 8
+
+INSERT_ENTRY = (
+    "INSERT INTO infraction_log "
+    "(guild_id, user_id, action, action_by, action_by_name, word, points_added, note, created_at, matched_text) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+# Widths of the MySQL infraction_log VARCHAR columns; longer values would fail the whole batched insert
+ACTION_LENGTH = 64
+NAME_LENGTH = 255
+
+
+def clip(value, length):
+    return value[:length] if isinstance(value, str) else value
+
+
+def parse_timestamp(value):
+    """Parses a stored isoformat timestamp, falling back to now for malformed entries."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+def entry_row(guild_id, user_id, entry):
+    """Converts a log entry dict into an infraction_log row."""
+    return (
+        guild_id,
+        user_id,
+        clip(entry.get("action", "infraction"), ACTION_LENGTH),
+        entry.get("action_by"),
+        clip(entry.get("action_by_name"), NAME_LENGTH),
+        clip(entry.get("word"), NAME_LENGTH),
+        entry.get("points_added") or 0,
+        entry.get("note"),
+        parse_timestamp(entry.get("timestamp")),
+        entry.get("matched_text"),
+    )
+
+
+def row_entry(row):
+    """Converts an infraction_log row back into the log entry dict the cogs display."""
+    action, action_by, action_by_name, word, points_added, note, created_at, matched_text = row
+    entry = {
+        "action": action,
+        "action_by": action_by,
+        "action_by_name": action_by_name,
+        "points_added": points_added,
+        "note": note,
+        "timestamp": created_at.isoformat() if isinstance(created_at, datetime) else str(created_at),
+    }
+    if word is not None:
+        entry["word"] = word
+    if matched_text is not None:
+        entry["matched_text"] = matched_text
+    return entry
+
+
+def month_of(created_at):
+    """Archive bucket for a created_at value, as YYYY-MM."""
+    if isinstance(created_at, datetime):
+        return created_at.strftime("%Y-%m")
+    return str(created_at)[:7]
+
+
+def pack_entries(entries):
+    """Compresses entries as zlib'd JSON lines."""
+    return zlib.compress("\n".join(json.dumps(entry) for entry in entries).encode("utf-8"))
+
+
+def unpack_entries(data):
+    if not data:
+        return []
+    return [json.loads(line) for line in zlib.decompress(data).decode("utf-8").splitlines()]
+
+
+class InfractionLog:
+    """Append-only per-user infraction history stored one row per event."""
+
+    def __init__(self, db, config=None):
+        config = config or {}
+        self.db = db
+        # Keep appending to users.log_json while older deployments still read it
+        self.write_log_json = config.get('write_log_json', False)
+        self.view_limit = config.get('view_limit', 10)
+        self.page_size = config.get('page_size', 5)
+        # Entries older than this move to infraction_archive, compressed per user per month
+        self.archive_after_days = config.get('archive_after_days', 90)
+        self.compact_batch = config.get('compact_batch', 5000)
+        # Longest users.log_json array kept inline when it is still being written
+        self.inline_tail = config.get('inline_tail', 50)
+
+    def add_with_cursor(self, cursor, guild_id, user_id, entry):
+        """Records one entry using an existing cursor so it can share a transaction."""
+        cursor.execute(INSERT_ENTRY, entry_row(guild_id, user_id, entry))
+        if self.write_log_json:
+            cursor.execute(APPEND_LOG_JSON[self.db.dialect], (json.dumps(entry), guild_id, user_id))
+
+    def add_many_with_cursor(self, cursor, guild_id, user_ids, entry):
+        """Records the same entry for several users with one batched insert."""
+        self.add_entries_with_cursor(cursor, [(guild_id, user_id, entry) for user_id in user_ids])
+
+    def add_entries_with_cursor(self, cursor, entries):
+        """Records (guild_id, user_id, entry) triples with one batched insert."""
+        if not entries:
+            return
+        cursor.executemany(INSERT_ENTRY, [entry_row(guild_id, user_id, entry) for guild_id, user_id, entry in entries])
+        if self.write_log_json:
+            cursor.executemany(
+                APPEND_LOG_JSON[self.db.dialect],
+                [(json.dumps(entry), guild_id, user_id) for guild_id, user_id, entry in entries],
+            )
+
+    async def add(self, guild_id, user_id, entry):
+        """Records one log entry for a user."""
+        await self.db.transaction(lambda cursor: self.add_with_cursor(cursor, guild_id, user_id, entry), label="infraction_log.add")
+
+    async def recent(self, guild_id, user_id, limit=None):
+        """Returns the newest entries for a user in chronological order."""
+        rows = await self.db.fetchall(
+            f"SELECT {ENTRY_COLUMNS} FROM infraction_log "
+            "WHERE guild_id = %s AND user_id = %s ORDER BY id DESC LIMIT %s",
+            (guild_id, user_id, limit or self.view_limit),
+        )
+        return [row_entry(row) for row in reversed(rows)]
+
+    async def count(self, guild_id, user_id):
+        """Returns how many entries a user has, answered from the (guild_id, user_id, id) index."""
+        result = await self.db.fetchone(
+            "SELECT COUNT(*) FROM infraction_log WHERE guild_id = %s AND user_id = %s",
+            (guild_id, user_id),
+        )
+        return result[0] if result else 0
+
+    async def page(self, guild_id, user_id, page, per_page=None):
+        """Returns one page of a user's entries, newest first."""
+        per_page = per_page or self.page_size
+        rows = await self.db.fetchall(
+            f"SELECT {ENTRY_COLUMNS} FROM infraction_log "
+            "WHERE guild_id = %s AND user_id = %s ORDER BY id DESC LIMIT %s OFFSET %s",
+            (guild_id, user_id, per_page, page * per_page),
+        )
+        return [row_entry(row) for row in rows]
+
+    async def archive_summary(self, guild_id, user_id):
+        """Returns (entries, points_added) held in the archive for a user."""
+        result = await self.db.fetchone(
+            "SELECT COALESCE(SUM(entries), 0), COALESCE(SUM(points_added), 0) FROM infraction_archive "
+            "WHERE guild_id = %s AND user_id = %s",
+            (guild_id, user_id),
+        )
+        return (int(result[0]), int(result[1])) if result else (0, 0)
+
+    async def archived(self, guild_id, user_id, month=None):
+        """Returns a user's archived entries oldest first, optionally limited to one YYYY-MM month."""
+        query = "SELECT data FROM infraction_archive WHERE guild_id = %s AND user_id = %s"
+        params = (guild_id, user_id)
+        if month:
+            query += " AND month = %s"
+            params += (month,)
+        rows = await self.db.fetchall(query + " ORDER BY month", params)
+        entries = []
+        for (data,) in rows:
+            entries.extend(unpack_entries(data))
+        return entries
+
+    async def compact(self, max_age_days=None):
+        """Moves entries older than max_age_days into infraction_archive and trims users.log_json.
+
+        Runs in batches, each its own transaction, so the job never holds locks on the whole table. Returns the
+        number of entries archived.
+        """
+        days = self.archive_after_days if max_age_days is None else max_age_days
+        cutoff = datetime.now() - timedelta(days=days)
+        lock = " FOR UPDATE" if self.db.dialect == "mysql" else ""
+
+        def work(cursor):
+            cursor.execute(SELECT_EXPIRED + lock, (cutoff, self.compact_batch))
+            rows = cursor.fetchall()
+            groups = {}
+            for row in rows:
+                key = (row[1], row[2], month_of(row[9]))
+                groups.setdefault(key, []).append(row_entry(row[3:]))
+            for (guild_id, user_id, month), entries in groups.items():
+                cursor.execute(SELECT_ARCHIVE_MONTH + lock, (guild_id, user_id, month))
+                existing = cursor.fetchone()
+                count, points = (existing[0], existing[1]) if existing else (0, 0)
+                merged = (unpack_entries(existing[2]) if existing else []) + entries
+                points += sum(entry.get("points_added") or 0 for entry in entries)
+                cursor.execute(
+                    UPSERT_ARCHIVE_MONTH[self.db.dialect],
+                    (guild_id, user_id, month, count + len(entries), points, pack_entries(merged)),
+                )
+            ids = [row[0] for row in rows]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cursor.execute(f"DELETE FROM infraction_log WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            return len(rows)
+
+        total = 0
+        while True:
+            moved = await self.db.transaction(work, label="infraction_log.compact")
+            total += moved
+            if moved < self.compact_batch:
+                break
+        if self.write_log_json or BACKFILL_MIGRATION in await applied_versions(self.db):
+            await self.trim_log_json()
+        if total:
+            # Cluster workers watch this to drop the counts and log tails they cached before the move
+            await self.db.execute(UPSERT_JOB_RUN[self.db.dialect], ("compaction", int(time.time())))
+        return total
+
+    async def last_compaction(self):
+        """Returns when compact() last finished, as a unix timestamp, or 0 if it never ran."""
+        result = await self.db.fetchone(SELECT_JOB_RUN, ("compaction",))
+        return result[0] if result else 0
+
+    async def trim_log_json(self):
+        """Cuts users.log_json down to its newest inline_tail entries, walking users in key-ordered batches.
+
+        Only run while log_json is mirrored from infraction_log or after the backfill migration, so every trimmed
+        entry is still in the log or the archive. Returns the number of users trimmed.
+        """
+        query = (
+            f"SELECT guild_id, user_id, log_json FROM users WHERE log_json IS NOT NULL "
+            f"AND {JSON_LENGTH[self.db.dialect]} > %s"
+        )
+        order = " ORDER BY guild_id, user_id LIMIT %s"
+        rows = await self.db.fetchall(query + order, (self.inline_tail, self.compact_batch))
+        total = 0
+        while rows:
+            updates = []
+            for guild_id, user_id, log_json in rows:
+                try:
+                    entries = json.loads(log_json)
+                except json.JSONDecodeError:
+                    continue
+                updates.append((json.dumps(entries[-self.inline_tail:]), guild_id, user_id))
+            if updates:
+                await self.db.executemany("UPDATE users SET log_json = %s WHERE guild_id = %s AND user_id = %s", updates)
+                total += len(updates)
+            if len(rows) < self.compact_batch:
+                break
+            guild_id, user_id = rows[-1][0], rows[-1][1]
+            rows = await self.db.fetchall(
+                query + " AND (guild_id > %s OR (guild_id = %s AND user_id > %s))" + order,
+                (self.inline_tail, guild_id, guild_id, user_id, self.compact_batch),
+            )
+        return total
+
+
+async def migrate(config):
+    """Brings the schema up to date, which includes backfilling infraction_log from users.log_json."""
+    db = create_database(config['database'])
+    try:
+        ran = await apply_migrations(db)
+        print(f"Applied {len(ran)} migrations." if ran else "Schema is up to date.")
+    finally:
+        db.close()
+
+
+async def compact(config):
+    """Archives old entries once, for running the compaction job from cron instead of the bot."""
+    db = create_database(config['database'])
+    try:
+        await apply_migrations(db)
+        total = await InfractionLog(db, config.get('infraction_log')).compact()
+        print(f"Archived {total} infraction log entries.")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    # python -m utils.infractions [--compact]
+    with open("datastores/config.json", 'r') as f:
+        config = json.load(f)
+    asyncio.run(compact(config) if "--compact" in sys.argv[1:] else migrate(config))
@@ -0,0 +1,147 @@
+from collections import deque
+
+# Removed words leave their nodes behind; the trie is rebuilt once at least this many are dead and they
+# outnumber the live ones
+REBUILD_MIN_DEAD = 64
+
+
+class WordMatcher:
+    """Aho-Corasick automaton that finds every filtered word in a single pass over a message."""
+
+    def __init__(self, words=None):
+        self.words = {}  # word -> points, the same shape as guild_settings.chat_words
+        self._reset()
+        if words:
+            self.sync(words)
+
+    def _reset(self):
+        self.goto = [{}]  # Trie transitions per node
+        self.fail = [0]  # Longest proper suffix that is also a trie node
+        self.terminal = [None]  # Word ending at this node, if any
+        self.dict_link = [0]  # Nearest suffix node that ends a word
+
+    def _insert(self, word):
+        """Adds a word's path to the trie without relinking."""
+        node = 0
+        for ch in word:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.terminal.append(None)
+                self.dict_link.append(0)
+            node = nxt
+        self.terminal[node] = word
+
+    def _find_node(self, word):
+        node = 0
+        for ch in word:
+            node = self.goto[node].get(ch)
+            if node is None:
+                return None
+        return node
+
+    def _link(self):
+        """Recomputes failure and output links breadth-first."""
+        queue = deque()
+        for child in self.goto[0].values():
+            self.fail[child] = 0
+            self.dict_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                suffix = self.fail[child]
+                self.dict_link[child] = suffix if self.terminal[suffix] is not None else self.dict_link[suffix]
+                queue.append(child)
+
+    def _unmark(self, word):
+        del self.words[word]
+        node = self._find_node(word)
+        if node is not None:
+            self.terminal[node] = None
+
+    def _rebuild_if_sparse(self):
+        """Rebuilds the trie from the live words once removals left it mostly dead. Returns True if it did."""
+        # Live words can't use more than one node per character, so the rest are certainly dead
+        live = sum(len(word) for word in self.words)
+        dead = len(self.goto) - 1 - live
+        if dead < REBUILD_MIN_DEAD or dead <= live:
+            return False
+        self._reset()
+        for word in self.words:
+            self._insert(word)
+        self._link()
+        return True
+
+    def sync(self, words):
+        """Brings the automaton in line with a new {word: points} table, relinking only when words were added."""
+        added = False
+        removed = False
+        for word in list(self.words):
+            if word not in words:
+                self._unmark(word)
+                removed = True
+        for word, points in words.items():
+            if word not in self.words:
+                self._insert(word)
+                added = True
+            self.words[word] = points
+        if removed and self._rebuild_if_sparse():
+            return
+        if added:
+            self._link()
+
+    def add(self, word, points):
+        """Adds a single word to the automaton."""
+        self.sync({**self.words, word: points})
+
+    def remove(self, word):
+        """Removes a word; links through its node stay valid and simply yield nothing until the next rebuild."""
+        if word not in self.words:
+            return
+        self._unmark(word)
+        self._rebuild_if_sparse()
+
+    def find(self, text):
+        """Returns {word: points} for every filtered word that occurs in the text."""
+        found = {}
+        if "" in self.words:
+            found[""] = self.words[""]
+        goto, fail, terminal, dict_link = self.goto, self.fail, self.terminal, self.dict_link
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            out = node
+            while out:
+                word = terminal[out]
+                if word is not None and word not in found:
+                    found[word] = self.words[word]
+                out = dict_link[out]
+        return found
+
+    def matches(self, text):
+        """Yields (word, start, end) for every occurrence of a filtered word in the text."""
+        goto, fail, terminal, dict_link = self.goto, self.fail, self.terminal, self.dict_link
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            out = node
+            while out:
+                word = terminal[out]
+                if word is not None:
+                    yield word, i + 1 - len(word), i + 1
+                out = dict_link[out]
+
+    def __len__(self):
+        return len(self.words)
@@ -0,0 +1,215 @@
+import bisect
+import functools
+import re
+import time
+import tracemalloc
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self.key(labels)] = value
+
+    def clear(self):
+        self.values.clear()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series["buckets"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def time(self, **labels):
+        """Decorator that observes how long an async function takes."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Registry:
+    """Holds every metric and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Registers a callable that refreshes gauges right before each scrape."""
+        self.collectors.append(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+COMMAND_LATENCY = REGISTRY.histogram("progressive_command_seconds", "Slash command latency.", ["command", "outcome"])
+LISTENER_LATENCY = REGISTRY.histogram("progressive_listener_seconds", "Event listener and background task latency.", ["listener"])
+DB_QUERIES = REGISTRY.counter("progressive_db_queries_total", "Database statements executed.", ["statement"])
+DB_LATENCY = REGISTRY.histogram("progressive_db_query_seconds", "Database statement latency including pool wait.", ["statement"])
+DECAY_DURATION = REGISTRY.histogram("progressive_decay_tick_seconds", "Duration of each point decay tick.")
+DECAY_ROWS = REGISTRY.counter("progressive_decay_rows_total", "Rows decayed by point_decay_loop.")
+DECAY_CROSSED = REGISTRY.counter("progressive_decay_crossed_total", "Rows that entered a warning or ban tier during decay.")
+RAID_TRIPS = REGISTRY.counter("progressive_raid_trips_total", "Raid detector thresholds tripped.", ["kind"])
+USER_CACHE_LOOKUPS = REGISTRY.counter("progressive_user_cache_lookups_total", "User record cache lookups.", ["result"])
+USER_CACHE_ENTRIES = REGISTRY.gauge("progressive_user_cache_entries", "Entries held in the user record cache.")
+USER_CACHE_BYTES = REGISTRY.gauge("progressive_user_cache_bytes", "Approximate memory held by the user record cache.")
+USER_CACHE_EVICTIONS = REGISTRY.gauge("progressive_user_cache_evictions", "User record cache evictions since start.")
+WRITE_BEHIND_DEPTH = REGISTRY.gauge("progressive_write_behind_depth", "Point accruals buffered and not yet committed.")
+OUTBOUND_QUEUE_DEPTH = REGISTRY.gauge("progressive_outbound_queue_depth", "Outbound DM/ban actions waiting to be sent.")
+GATEWAY_LATENCY = REGISTRY.gauge("progressive_gateway_latency_seconds", "Gateway heartbeat latency per shard.", ["shard"])
+TRACED_MEMORY = REGISTRY.gauge("progressive_traced_memory_bytes", "Memory traced by tracemalloc.", ["kind"])
+
+
+def statement_label(query):
+    """Collapses whitespace and trims a SQL statement so it can be used as a label."""
+    return re.sub(r"\s+", " ", query).strip()[:120]
+
+
+class MetricsServer:
+    """Serves REGISTRY on a local HTTP endpoint for Prometheus to scrape."""
+
+    def __init__(self, bot, config=None):
+        config = config or {}
+        self.bot = bot
+        self.enabled = config.get('enabled', False)
+        self.host = config.get('host', '127.0.0.1')
+        self.port = config.get('port', 9108)
+        self.runner = None
+        REGISTRY.add_collector(self.collect)
+
+    def collect(self):
+        OUTBOUND_QUEUE_DEPTH.set(self.bot.dispatcher.depth)
+        WRITE_BEHIND_DEPTH.set(self.bot.point_buffer.depth)
+        cache = self.bot.repository.cache
+        USER_CACHE_ENTRIES.set(len(cache))
+        USER_CACHE_BYTES.set(cache.bytes)
+        USER_CACHE_EVICTIONS.set(cache.evictions)
+        GATEWAY_LATENCY.clear()
+        for shard_id, latency in self.bot.latencies:
+            GATEWAY_LATENCY.set(latency, shard=shard_id)
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            TRACED_MEMORY.set(current, kind="current")
+            TRACED_MEMORY.set(peak, kind="peak")
+
+    async def handle_metrics(self, request):
+        return web.Response(
+            body=REGISTRY.render().encode('utf-8'),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def start(self, port_offset=0):
+        if not self.enabled:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port + port_offset).start()
+        print(f"Serving metrics on http://{self.host}:{self.port + port_offset}/metrics")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
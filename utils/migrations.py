@@ -0,0 +1,385 @@
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from utils.database import create_database
+
+# (version, description, func) in the order they must run; func(cursor, dialect) applies one step
+MIGRATIONS = []
+
+CREATE_SCHEMA_MIGRATIONS = {
+    "mysql": """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME(6) NOT NULL
+        )
+    """,
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """,
+}
+SELECT_APPLIED = "SELECT version FROM schema_migrations"
+# Users per batch when a migration walks the users table in key order
+MIGRATION_BATCH = 500
+INSERT_APPLIED = "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, %s)"
+
+
+def migration(version, description):
+    """Registers a migration step under a version number."""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+# Introspection helpers, run with the migration's cursor
+
+def has_column(cursor, dialect, table, column):
+    if dialect == "mysql":
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+            (table, column),
+        )
+        return cursor.fetchone() is not None
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def has_index(cursor, dialect, table, name):
+    if dialect == "mysql":
+        cursor.execute(
+            # One row per indexed column, and migration cursors are unbuffered, so leave nothing unread
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+            (table, name),
+        )
+    else:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s", (table, name))
+    return cursor.fetchone() is not None
+
+
+def unique_keys(cursor, dialect, table):
+    """Returns {index_name: (columns...)} for the table's primary key and unique indexes."""
+    keys = {}
+    if dialect == "mysql":
+        cursor.execute(
+            "SELECT index_name, column_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND non_unique = 0 ORDER BY index_name, seq_in_index",
+            (table,),
+        )
+        for name, column in cursor.fetchall():
+            keys[name] = keys.get(name, ()) + (column,)
+        return keys
+    cursor.execute(f"PRAGMA table_info({table})")
+    primary = sorted((row[5], row[1]) for row in cursor.fetchall() if row[5])
+    if primary:
+        keys["PRIMARY"] = tuple(column for _, column in primary)
+    cursor.execute(f"PRAGMA index_list({table})")
+    for row in cursor.fetchall():
+        if row[2]:
+            cursor.execute(f"PRAGMA index_info({row[1]})")
+            keys[row[1]] = tuple(info[2] for info in sorted(cursor.fetchall()))
+    return keys
+
+
+def column_type(cursor, table, column):
+    """Returns the MySQL data type of a column, lower-cased."""
+    cursor.execute(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column),
+    )
+    result = cursor.fetchone()
+    return result[0].lower() if result else None
+
+
+def create_index(cursor, dialect, table, name, columns):
+    if not has_index(cursor, dialect, table, name):
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+
+# Migrations. Tables are created with IF NOT EXISTS and later steps inspect before altering, so deployments
+# whose tables were created by hand converge on the same schema as fresh ones.
+
+@migration(1, "create guild_settings and users")
+def create_base_tables(cursor, dialect):
+    if dialect == "mysql":
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS guild_settings (
+                guild_id BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+                mod_role_id BIGINT UNSIGNED NULL,
+                chat_words JSON NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                guild_id BIGINT UNSIGNED NOT NULL,
+                user_id BIGINT UNSIGNED NOT NULL,
+                status VARCHAR(32) NOT NULL DEFAULT 'active',
+                points INT NOT NULL DEFAULT 0,
+                log_json JSON NULL,
+                notes TEXT NULL,
+                PRIMARY KEY (guild_id, user_id)
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS guild_settings (
+                guild_id INTEGER PRIMARY KEY,
+                mod_role_id INTEGER,
+                chat_words TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'active',
+                points INTEGER NOT NULL DEFAULT 0,
+                log_json TEXT,
+                notes TEXT,
+                PRIMARY KEY (guild_id, user_id)
+            )
+        """)
+
+
+@migration(2, "key users by (guild_id, user_id)")
+def key_users(cursor, dialect):
+    keys = unique_keys(cursor, dialect, "users")
+    if ("guild_id", "user_id") in keys.values():
+        return
+    # Fails on duplicate (guild_id, user_id) rows, which have to be merged by hand first
+    if dialect == "mysql" and "PRIMARY" not in keys:
+        cursor.execute("ALTER TABLE users ADD PRIMARY KEY (guild_id, user_id)")
+    else:
+        cursor.execute("CREATE UNIQUE INDEX uq_users_guild_user ON users (guild_id, user_id)")
+
+
+@migration(3, "store chat_words and log_json as JSON and notes as TEXT")
+def column_types(cursor, dialect):
+    # SQLite columns take any type, so only MySQL tables need converting
+    if dialect != "mysql":
+        return
+    wanted = [
+        ("guild_settings", "chat_words", "json", "JSON NULL"),
+        ("users", "log_json", "json", "JSON NULL"),
+        ("users", "notes", "text", "TEXT NULL"),
+    ]
+    for table, column, data_type, definition in wanted:
+        current = column_type(cursor, table, column)
+        if current is not None and current != data_type:
+            cursor.execute(f"ALTER TABLE {table} MODIFY {column} {definition}")
+
+
+@migration(4, "add last_decay_at and the decay sweep indexes")
+def decay_columns(cursor, dialect):
+    if not has_column(cursor, dialect, "users", "last_decay_at"):
+        cursor.execute("ALTER TABLE users ADD COLUMN last_decay_at BIGINT NOT NULL DEFAULT 0")
+        # Existing rows start their decay clock now rather than at the epoch
+        cursor.execute("UPDATE users SET last_decay_at = %s WHERE last_decay_at = 0", (int(time.time()),))
+    create_index(cursor, dialect, "users", "idx_users_points", "points")
+    create_index(cursor, dialect, "users", "idx_users_status", "status")
+
+
+@migration(5, "create infraction_log")
+def infraction_log(cursor, dialect):
+    if dialect == "mysql":
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS infraction_log (
+                id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                guild_id BIGINT UNSIGNED NOT NULL,
+                user_id BIGINT UNSIGNED NOT NULL,
+                action VARCHAR(64) NOT NULL,
+                action_by BIGINT UNSIGNED NULL,
+                action_by_name VARCHAR(255) NULL,
+                word VARCHAR(255) NULL,
+                points_added INT NOT NULL DEFAULT 0,
+                note TEXT NULL,
+                created_at DATETIME(6) NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS infraction_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                action_by INTEGER NULL,
+                action_by_name TEXT NULL,
+                word TEXT NULL,
+                points_added INTEGER NOT NULL DEFAULT 0,
+                note TEXT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+    create_index(cursor, dialect, "infraction_log", "idx_infraction_log_user", "guild_id, user_id, id")
+
+
+@migration(6, "create infraction_archive and index infraction_log by age")
+def infraction_archive(cursor, dialect):
+    if dialect == "mysql":
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS infraction_archive (
+                guild_id BIGINT UNSIGNED NOT NULL,
+                user_id BIGINT UNSIGNED NOT NULL,
+                month CHAR(7) NOT NULL,
+                entries INT NOT NULL,
+                points_added BIGINT NOT NULL,
+                data LONGBLOB NOT NULL,
+                PRIMARY KEY (guild_id, user_id, month)
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS infraction_archive (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                entries INTEGER NOT NULL,
+                points_added INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (guild_id, user_id, month)
+            )
+        """)
+    create_index(cursor, dialect, "infraction_log", "idx_infraction_log_created", "created_at")
+
+
+@migration(7, "add matched_text to infraction_log")
+def infraction_matched_text(cursor, dialect):
+    # The filter records the raw message fragment that matched alongside the normalized word
+    if not has_column(cursor, dialect, "infraction_log", "matched_text"):
+        cursor.execute("ALTER TABLE infraction_log ADD COLUMN matched_text TEXT NULL")
+
+
+def users_with_log_json(cursor):
+    """Yields batches of (guild_id, user_id, log_json), walking users in key order."""
+    query = "SELECT guild_id, user_id, log_json FROM users WHERE log_json IS NOT NULL"
+    order = " ORDER BY guild_id, user_id LIMIT %s"
+    cursor.execute(query + order, (MIGRATION_BATCH,))
+    while True:
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        guild_id, user_id = rows[-1][0], rows[-1][1]
+        cursor.execute(
+            query + " AND (guild_id > %s OR (guild_id = %s AND user_id > %s))" + order,
+            (guild_id, guild_id, user_id, MIGRATION_BATCH),
+        )
+
+
+@migration(8, "backfill infraction_log from users.log_json")
+def backfill_infraction_log(cursor, dialect):
+    # Imported here because utils.infractions imports this module
+    from utils.infractions import INSERT_ENTRY, entry_row, parse_timestamp, unpack_entries
+
+    def key(action, created_at, points_added):
+        if not isinstance(created_at, datetime):
+            created_at = parse_timestamp(str(created_at))
+        return action, created_at, points_added or 0
+
+    for users in users_with_log_json(cursor):
+        rows = []
+        for guild_id, user_id, log_json in users:
+            try:
+                entries = json.loads(log_json)
+            except (TypeError, json.JSONDecodeError):
+                print(f"Skipping malformed log_json for user {user_id} in guild {guild_id}")
+                continue
+            if not isinstance(entries, list):
+                continue
+            # Entries already in infraction_log or the archive (mirrored writes, or a compacted earlier run) are
+            # matched off one for one, so only history that exists nowhere else gets copied
+            existing = {}
+            cursor.execute(
+                "SELECT action, created_at, points_added FROM infraction_log WHERE guild_id = %s AND user_id = %s",
+                (guild_id, user_id),
+            )
+            for row in cursor.fetchall():
+                existing[key(*row)] = existing.get(key(*row), 0) + 1
+            cursor.execute("SELECT data FROM infraction_archive WHERE guild_id = %s AND user_id = %s", (guild_id, user_id))
+            for (data,) in cursor.fetchall():
+                for entry in unpack_entries(data):
+                    entry_key = key(entry.get("action"), entry.get("timestamp"), entry.get("points_added"))
+                    existing[entry_key] = existing.get(entry_key, 0) + 1
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                row = entry_row(guild_id, user_id, entry)
+                entry_key = key(row[2], row[8], row[6])
+                if existing.get(entry_key):
+                    existing[entry_key] -= 1
+                    continue
+                rows.append(row)
+        if rows:
+            cursor.executemany(INSERT_ENTRY, rows)
+
+
+@migration(9, "create job_runs")
+def job_runs(cursor, dialect):
+    # When shared maintenance jobs last finished, so every cluster worker can notice a run made elsewhere
+    if dialect == "mysql":
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                job VARCHAR(64) NOT NULL PRIMARY KEY,
+                finished_at BIGINT NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                job TEXT PRIMARY KEY,
+                finished_at INTEGER NOT NULL
+            )
+        """)
+
+
+async def applied_versions(db):
+    await db.execute(CREATE_SCHEMA_MIGRATIONS[db.dialect])
+    return {row[0] for row in await db.fetchall(SELECT_APPLIED)}
+
+
+async def apply_migrations(db):
+    """Runs every migration not yet recorded in schema_migrations, returning the versions applied."""
+    applied = await applied_versions(db)
+    ran = []
+    for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+
+        def work(cursor, version=version, description=description, func=func):
+            func(cursor, db.dialect)
+            cursor.execute(INSERT_APPLIED, (version, description, datetime.now()))
+        # MySQL commits DDL implicitly, so each step is written to be safe to re-run if recording it fails
+        await db.transaction(work, label=f"migration_{version}")
+        print(f"Applied migration {version}: {description}")
+        ran.append(version)
+    return ran
+
+
+async def main(config, status_only=False):
+    db = create_database(config['database'])
+    try:
+        if status_only:
+            applied = await applied_versions(db)
+            for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+                print(f"{'applied' if version in applied else 'pending'}  {version}: {description}")
+            return
+        ran = await apply_migrations(db)
+        print(f"Applied {len(ran)} migrations." if ran else "Schema is up to date.")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    # python -m utils.migrations [--status]
+    with open("datastores/config.json", 'r') as f:
+        asyncio.run(main(json.load(f), status_only="--status" in sys.argv[1:]))
@@ -0,0 +1,173 @@
+import asyncio
+import multiprocessing
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.matcher import WordMatcher
+
+# Homoglyphs and leetspeak substitutions folded to the ASCII letter they imitate
+CONFUSABLES = {
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t",
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s",
+    # Greek
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o",
+    "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+}
+
+# Separators, punctuation, symbols and invisible characters (zero-width joiners are Cf)
+DROPPED_CATEGORIES = ("Z", "P", "S", "C", "M")
+
+
+def fold_char(ch):
+    """Folds one character to the string it normalizes to, possibly empty."""
+    folded = []
+    for part in unicodedata.normalize("NFKD", ch).casefold():
+        part = CONFUSABLES.get(part, part)
+        if unicodedata.category(part)[0] in DROPPED_CATEGORIES:
+            continue
+        folded.append(part)
+    return "".join(folded)
+
+
+def normalize(text):
+    """Returns (normalized, offsets) where offsets[i] is the index in text of normalized[i]."""
+    chars = []
+    offsets = []
+    for i, ch in enumerate(text):
+        for part in fold_char(ch):
+            chars.append(part)
+            offsets.append(i)
+    return "".join(chars), offsets
+
+
+def normalize_word(word):
+    """Normalizes a filter word the same way message text is normalized."""
+    return normalize(word)[0]
+
+
+def normalize_batch(texts):
+    """Worker entry point: normalizes a batch of messages in one executor round trip."""
+    return [normalize(text) for text in texts]
+
+
+class NormalizedMatcher:
+    """WordMatcher over normalized filter words that reports matches against the original text."""
+
+    def __init__(self, words=None):
+        self.words = {}
+        self.matcher = WordMatcher()
+        self.originals = {}  # normalized key -> the filter word charged when it matches
+        if words:
+            self.sync(words)
+
+    def sync(self, words):
+        """Brings the matcher in line with a new {word: points} table.
+
+        Filter words that fold to the same key (e.g. "bad" and "b4d") are one word once normalized, so a hit is
+        charged once, as the variant with the most points.
+        """
+        self.words = dict(words)
+        originals = {}
+        for word, points in words.items():
+            key = normalize_word(word)
+            if not key:
+                continue
+            if key not in originals or points > words[originals[key]]:
+                originals[key] = word
+        self.originals = originals
+        self.matcher.sync({key: words[word] for key, word in originals.items()})
+
+    def add(self, word, points):
+        self.sync({**self.words, word: points})
+
+    def remove(self, word):
+        if word in self.words:
+            self.sync({w: p for w, p in self.words.items() if w != word})
+
+    def matches(self, normalized, offsets):
+        """Yields (word, start, end) with start/end indexing the original, un-normalized text."""
+        for key, start, end in self.matcher.matches(normalized):
+            word = self.originals.get(key)
+            if word is not None:
+                yield word, offsets[start], offsets[end - 1] + 1
+
+    def find(self, normalized, offsets):
+        """Returns {word: (points, span)} with the first original-text span each word matched."""
+        found = {}
+        for word, start, end in self.matches(normalized, offsets):
+            if word not in found:
+                found[word] = (self.words[word], (start, end))
+        return found
+
+    def __len__(self):
+        return len(self.words)
+
+
+class NormalizationPool:
+    """Batches messages onto an executor so normalization never runs on the event loop."""
+
+    def __init__(self, config=None):
+        config = config or {}
+        workers = config.get("workers", 2)
+        if config.get("processes", True):
+            # Spawned rather than forked so workers don't inherit the bot's event loop, sockets, and DB pool. They
+            # re-import the main module, which is why bot.py keeps its startup behind __main__
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="normalize")
+        self.batch_size = config.get("batch_size", 32)
+        self.batch_delay = config.get("batch_delay", 0.005)
+        # Short messages are cheaper to fold inline than to ship to a worker
+        self.inline_limit = config.get("inline_limit", 256)
+        self.pending = []
+        self.timer = None
+        # The loop only keeps weak references to tasks, so in-flight batches are held here until they finish
+        self.tasks = set()
+
+    async def normalize(self, text):
+        """Returns (normalized, offsets) for a message."""
+        if len(text) <= self.inline_limit:
+            return normalize(text)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, future))
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.batch_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, normalize_batch, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        for _, future in self.pending:
+            future.cancel()
+        self.pending = []
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,74 @@
+import asyncio
+
+# Discord rejects messages longer than this
+MESSAGE_LIMIT = 2000
+
+
+class NotificationCoalescer:
+    """Collapses filter-hit warnings per channel so each channel gets at most one message per window."""
+
+    def __init__(self, window=5):
+        self.window = window
+        self.pending = {}  # channel_id -> (channel, {user_id: [mention, hits, points]})
+        self.tasks = {}
+
+    def add(self, channel, user, points):
+        """Records a hit and schedules the channel's summary if one isn't already waiting."""
+        entry = self.pending.get(channel.id)
+        if entry is None:
+            entry = self.pending[channel.id] = (channel, {})
+        users = entry[1]
+        if user.id in users:
+            users[user.id][1] += 1
+            users[user.id][2] += points
+        else:
+            users[user.id] = [user.mention, 1, points]
+        if channel.id not in self.tasks:
+            self.tasks[channel.id] = asyncio.create_task(self._flush_later(channel.id))
+
+    async def _flush_later(self, channel_id):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self.tasks.pop(channel_id, None)
+        await self.flush(channel_id)
+
+    async def flush(self, channel_id):
+        """Sends the pending summary for a channel."""
+        entry = self.pending.pop(channel_id, None)
+        if entry is None:
+            return
+        channel, users = entry
+        lines = []
+        for mention, hits, points in users.values():
+            if hits == 1:
+                lines.append(f"{mention}, you used prohibited words. {points} points have been added to your record.")
+            else:
+                lines.append(f"{mention}, you used prohibited words {hits} times. {points} points have been added to your record.")
+        for chunk in chunk_lines(lines):
+            try:
+                await channel.send(chunk)
+            except Exception as e:
+                print(f"Error sending filter warning to channel {channel_id}: {e}")
+
+    async def flush_all(self):
+        """Sends every pending summary immediately, used when the cog unloads."""
+        for task in list(self.tasks.values()):
+            task.cancel()
+        self.tasks.clear()
+        for channel_id in list(self.pending):
+            await self.flush(channel_id)
+
+
+def chunk_lines(lines):
+    """Groups lines into messages that fit within Discord's length limit."""
+    chunk = ""
+    for line in lines:
+        line = line[:MESSAGE_LIMIT]
+        if chunk and len(chunk) + 1 + len(line) > MESSAGE_LIMIT:
+            yield chunk
+            chunk = line
+        else:
+            chunk = f"{chunk}\n{line}" if chunk else line
+    if chunk:
+        yield chunk
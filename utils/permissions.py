@@ -0,0 +1,61 @@
+import discord
+from discord import app_commands
+from utils.cache import LRUCache
+
+# Cached marker for guilds that have no mod role configured
+NO_ROLE = 0
+
+
+class MissingModRole(app_commands.CheckFailure):
+    """Raised when a user is neither an admin nor holds the guild's mod role."""
+
+
+class PermissionService:
+    """Caches each guild's mod_role_id so command checks don't query the database."""
+
+    def __init__(self, repository, config=None):
+        config = config or {}
+        self.repository = repository
+        self.cache = LRUCache(config.get('mod_role_size', 1000), ttl=config.get('mod_role_ttl', 300))
+
+    async def get_mod_role_id(self, guild_id):
+        """Returns the guild's mod_role_id, loading it on a cache miss."""
+        role_id = self.cache.get(guild_id)
+        if role_id is not None:
+            return role_id
+        role_id = await self.repository.get_mod_role_id(guild_id) or NO_ROLE
+        self.cache.set(guild_id, role_id)
+        return role_id
+
+    def set_mod_role(self, guild_id, role_id):
+        """Updates the cached role after guild_settings has been written."""
+        self.cache.set(guild_id, role_id or NO_ROLE)
+
+    def invalidate(self, guild_id):
+        self.cache.pop(guild_id)
+
+    async def has_permission(self, interaction: discord.Interaction) -> bool:
+        """Check if the user is an admin or has the mod role from the database."""
+        user = interaction.user
+
+        # Check if the user is an admin
+        if user.guild_permissions.administrator:
+            return True
+
+        # Check if the user has the mod role
+        try:
+            mod_role_id = await self.get_mod_role_id(interaction.guild_id)
+            if mod_role_id and user.get_role(mod_role_id):
+                return True
+        except Exception as e:
+            print(f"Error checking permissions: {e}")
+        return False
+
+
+def is_moderator():
+    """App command check that allows admins and members holding the guild's mod role."""
+    async def predicate(interaction: discord.Interaction) -> bool:
+        if interaction.guild is None or not await interaction.client.permissions.has_permission(interaction):
+            raise MissingModRole("You do not have permission to use this command.")
+        return True
+    return app_commands.check(predicate)
@@ -0,0 +1,101 @@
+import time
+from collections import deque
+from utils.cache import LRUCache
+
+
+class SlidingWindowCounter:
+    """Event count over the last `window` seconds, kept in a ring of fixed-width buckets.
+
+    Each update touches the current bucket and clears buckets that aged out since the last update, so the cost is
+    O(1) amortized and memory is fixed at `buckets` slots.
+    """
+
+    def __init__(self, window, buckets):
+        self.width = window / buckets
+        self.counts = [0] * buckets
+        self.total = 0
+        self.current = None  # Absolute index of the newest bucket
+
+    def _advance(self, now):
+        index = int(now / self.width)
+        if self.current is None:
+            self.current = index
+        elif index > self.current:
+            size = len(self.counts)
+            # Clear every slot between the old and new bucket, at most one full lap
+            for step in range(1, min(index - self.current, size) + 1):
+                slot = (self.current + step) % size
+                self.total -= self.counts[slot]
+                self.counts[slot] = 0
+            self.current = index
+        return self.current % len(self.counts)
+
+    def add(self, now=None, amount=1):
+        """Records events and returns the count within the window."""
+        slot = self._advance(time.monotonic() if now is None else now)
+        self.counts[slot] += amount
+        self.total += amount
+        return self.total
+
+    def count(self, now=None):
+        self._advance(time.monotonic() if now is None else now)
+        return self.total
+
+
+class RaidDetector:
+    """In-memory per-guild join-rate and per-user message-rate detection; never touches the database."""
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.join_threshold = config.get('joins_per_window', 10)
+        self.join_window = config.get('join_window', 60)
+        self.message_threshold = config.get('messages_per_window', 8)
+        self.message_window = config.get('message_window', 5)
+        # Once tripped, a guild stays in raid mode for this long and every new join is flagged as it arrives
+        self.raid_cooldown = config.get('raid_cooldown', 300)
+        self.buckets = config.get('buckets', 10)
+        self.joins = {}  # guild_id -> SlidingWindowCounter
+        self.recent_joins = {}  # guild_id -> deque of (joined_at, member_id), bounded by the threshold
+        self.raid_until = {}  # guild_id -> monotonic time raid mode ends
+        self.messages = LRUCache(config.get('tracked_users', 50000))  # (guild_id, user_id) -> counter
+        self.flagged = LRUCache(config.get('tracked_users', 50000), ttl=self.message_window)
+
+    def in_raid(self, guild_id, now=None):
+        now = time.monotonic() if now is None else now
+        return self.raid_until.get(guild_id, 0) > now
+
+    def record_join(self, guild_id, member_id, now=None):
+        """Counts a join and returns the member ids to act on: the burst that tripped the threshold, or the
+        single joiner while the guild is already in raid mode, or nothing."""
+        now = time.monotonic() if now is None else now
+        if self.in_raid(guild_id, now):
+            self.raid_until[guild_id] = now + self.raid_cooldown
+            return [member_id]
+
+        counter = self.joins.get(guild_id)
+        if counter is None:
+            counter = self.joins[guild_id] = SlidingWindowCounter(self.join_window, self.buckets)
+        recent = self.recent_joins.get(guild_id)
+        if recent is None:
+            recent = self.recent_joins[guild_id] = deque(maxlen=self.join_threshold)
+        recent.append((now, member_id))
+
+        if counter.add(now) < self.join_threshold:
+            return []
+        self.raid_until[guild_id] = now + self.raid_cooldown
+        burst = [joined_id for joined_at, joined_id in recent if now - joined_at <= self.join_window]
+        recent.clear()
+        return burst
+
+    def record_message(self, guild_id, user_id, now=None):
+        """Counts a message and returns True the first time a user exceeds the message rate within a window."""
+        now = time.monotonic() if now is None else now
+        key = (guild_id, user_id)
+        counter = self.messages.get(key)
+        if counter is None:
+            counter = SlidingWindowCounter(self.message_window, self.buckets)
+            self.messages.set(key, counter)
+        if counter.add(now) < self.message_threshold or key in self.flagged:
+            return False
+        self.flagged.set(key, True)
+        return True
@@ -0,0 +1,424 @@
+import json
+import time
+from utils.cache import MemoryBoundedCache
+from utils.metrics import USER_CACHE_LOOKUPS
+
+SELECT_CHAT_WORDS = "SELECT chat_words FROM guild_settings WHERE guild_id = %s"
+# Creates the guild's settings row if the guild was never configured, so the write can't silently match nothing
+UPSERT_CHAT_WORDS = {
+    "mysql": "INSERT INTO guild_settings (guild_id, chat_words) VALUES (%s, %s) "
+             "ON DUPLICATE KEY UPDATE chat_words = VALUES(chat_words)",
+    "sqlite": "INSERT INTO guild_settings (guild_id, chat_words) VALUES (%s, %s) "
+              "ON CONFLICT (guild_id) DO UPDATE SET chat_words = excluded.chat_words",
+}
+SELECT_MOD_ROLE = "SELECT mod_role_id FROM guild_settings WHERE guild_id = %s"
+SELECT_GUILD_EXISTS = "SELECT 1 FROM guild_settings WHERE guild_id = %s"
+UPDATE_MOD_ROLE = "UPDATE guild_settings SET mod_role_id = %s WHERE guild_id = %s"
+INSERT_GUILD = "INSERT INTO guild_settings (guild_id, mod_role_id) VALUES (%s, %s)"
+
+SELECT_USER_DECAY = "SELECT points, status, notes, last_decay_at FROM users WHERE guild_id = %s AND user_id = %s"
+SELECT_POINTS = "SELECT points, last_decay_at FROM users WHERE guild_id = %s AND user_id = %s"
+UPDATE_POINTS = "UPDATE users SET points = %s, last_decay_at = %s WHERE guild_id = %s AND user_id = %s"
+INSERT_USER = (
+    "INSERT INTO users (guild_id, user_id, status, points, log_json, notes, last_decay_at) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+# Bulk accrual: adds to existing rows or creates them in a single statement per batch
+UPSERT_POINTS = {
+    "mysql": (
+        "INSERT INTO users (guild_id, user_id, status, points, log_json, notes, last_decay_at) "
+        "VALUES (%s, %s, 'active', %s, NULL, '', %s) "
+        "ON DUPLICATE KEY UPDATE points = {points} + VALUES(points), last_decay_at = {last_decay_at}"
+    ),
+    "sqlite": (
+        "INSERT INTO users (guild_id, user_id, status, points, log_json, notes, last_decay_at) "
+        "VALUES (%s, %s, 'active', %s, NULL, '', %s) "
+        "ON CONFLICT (guild_id, user_id) DO UPDATE SET points = {points} + excluded.points, last_decay_at = {last_decay_at}"
+    ),
+}
+# Keeps IN (...) lists well under placeholder limits
+BULK_CHUNK = 500
+UPDATE_NOTES = "UPDATE users SET notes = %s WHERE guild_id = %s AND user_id = %s"
+
+
+def status_case(points_expr, tiers):
+    """Builds a SQL CASE expression that maps a points expression to its tier status."""
+    branches = " ".join(
+        f"WHEN {points_expr} >= {int(tier['points'])} THEN '{tier['status']}'" for tier in reversed(tiers)
+    )
+    return f"CASE {branches} ELSE 'active' END"
+
+
+# Distinguishes "not cached" from a cached "no record"
+MISSING = object()
+
+
+class ModerationRepository:
+    """Owns every query against the users and guild_settings tables for both backends."""
+
+    def __init__(self, db, infraction_log, decay=None, cache=None):
+        self.db = db
+        self.infraction_log = infraction_log
+        cache = cache or {}
+        # Read-through cache of user rows and log tails; every write below updates or drops the affected keys
+        self.cache = MemoryBoundedCache(
+            cache.get('user_record_size', 50000),
+            ttl=cache.get('user_record_ttl', 300),
+            maxbytes=cache.get('user_record_bytes', 32 * 1024 * 1024),
+        )
+        # Bumped whenever a key is dropped or written through, so a fill whose read started before that can tell
+        # its value is stale; the global one covers invalidate_all
+        self.generations = {}
+        self.global_generation = 0
+        self.max_generations = cache.get('user_record_size', 50000)
+        decay = decay or {}
+        # In lazy mode points are decayed when a row is read or written instead of by a table-wide pass
+        self.lazy_decay = decay.get("mode", "eager") == "lazy"
+        self.decay_points = decay.get("points", 10)
+        self.decay_interval = decay.get("interval", 900)
+
+    @property
+    def is_mysql(self):
+        return self.db.dialect == "mysql"
+
+    @property
+    def row_lock(self):
+        return " FOR UPDATE" if self.is_mysql else ""
+
+    # cache
+
+    def cached(self, key):
+        """Returns the cached value for key, or MISSING, and records the lookup."""
+        value = self.cache.get(key, MISSING)
+        USER_CACHE_LOOKUPS.inc(result="miss" if value is MISSING else "hit")
+        return value
+
+    def generation(self, key):
+        """Snapshot to take before reading the value a cache fill will store."""
+        return self.global_generation, self.generations.get(key, 0)
+
+    def fill(self, key, value, generation):
+        """Caches a value read from the database unless key was invalidated while the read was running."""
+        if generation == self.generation(key):
+            self.cache.set(key, value)
+
+    def bump(self, key):
+        if len(self.generations) >= self.max_generations:
+            # Resetting the per-key counters is only safe together with a global bump
+            self.generations.clear()
+            self.global_generation += 1
+        self.generations[key] = self.generations.get(key, 0) + 1
+
+    def forget(self, key):
+        self.cache.pop(key)
+        self.bump(key)
+
+    def write_through(self, key, value):
+        self.cache.set(key, value)
+        self.bump(key)
+
+    def invalidate(self, guild_id, user_id):
+        """Drops everything cached about a user."""
+        self.forget(("user", guild_id, user_id))
+        self.forget(("recent", guild_id, user_id))
+        self.forget(("count", guild_id, user_id))
+
+    def invalidate_all(self):
+        self.cache.clear()
+        self.generations.clear()
+        self.global_generation += 1
+
+    # guild_settings
+
+    async def get_chat_words(self, guild_id):
+        """Returns the guild's parsed chat_words table."""
+        result = await self.db.fetchone(SELECT_CHAT_WORDS, (guild_id,))
+        return json.loads(result[0]) if result and result[0] else {}
+
+    async def set_chat_words(self, guild_id, chat_words):
+        await self.db.execute(UPSERT_CHAT_WORDS[self.db.dialect], (guild_id, json.dumps(chat_words)))
+
+    async def get_mod_role_id(self, guild_id):
+        result = await self.db.fetchone(SELECT_MOD_ROLE, (guild_id,))
+        return result[0] if result else None
+
+    async def set_mod_role_id(self, guild_id, role_id):
+        """Stores or updates the guild's mod_role_id."""
+        def work(cursor):
+            cursor.execute(SELECT_GUILD_EXISTS, (guild_id,))
+            if cursor.fetchone():
+                cursor.execute(UPDATE_MOD_ROLE, (role_id, guild_id))
+            else:
+                cursor.execute(INSERT_GUILD, (guild_id, role_id))
+        await self.db.transaction(work, label="set_mod_role_id")
+
+    # users
+
+    def decayed(self, points, last_decay_at, now):
+        """Applies the decay ticks elapsed since last_decay_at, returning (points, last_decay_at).
+
+        The clock only advances by whole ticks so a partial tick carries over to the next read.
+        """
+        ticks = max(now - last_decay_at, 0) // self.decay_interval
+        if ticks <= 0:
+            return points, last_decay_at
+        return max(points - self.decay_points * ticks, 0), last_decay_at + ticks * self.decay_interval
+
+    async def get_record(self, guild_id, user_id):
+        """Returns the raw (points, status, notes, last_decay_at) row for a user, or None, through the cache."""
+        key = ("user", guild_id, user_id)
+        record = self.cached(key)
+        if record is MISSING:
+            generation = self.generation(key)
+            record = await self.db.fetchone(SELECT_USER_DECAY, (guild_id, user_id))
+            self.fill(key, tuple(record) if record else None, generation)
+        return record
+
+    async def get_user(self, guild_id, user_id):
+        """Returns (points, status, notes) for a user, or None."""
+        record = await self.get_record(guild_id, user_id)
+        if record is None:
+            return None
+        points, status, notes, last_decay_at = record
+        if not self.lazy_decay or self.decayed(points, last_decay_at, int(time.time()))[1] == last_decay_at:
+            return points, status, notes
+
+        # A decay tick passed since the row was written, materialize it
+        def work(cursor):
+            cursor.execute(SELECT_USER_DECAY + self.row_lock, (guild_id, user_id))
+            result = cursor.fetchone()
+            if not result:
+                return None
+            points, status, notes, last_decay_at = result
+            new_points, new_last_decay_at = self.decayed(points, last_decay_at, int(time.time()))
+            if new_last_decay_at != last_decay_at:
+                cursor.execute(UPDATE_POINTS, (new_points, new_last_decay_at, guild_id, user_id))
+            return new_points, status, notes, new_last_decay_at
+        key = ("user", guild_id, user_id)
+        generation = self.generation(key)
+        record = await self.db.transaction(work, label="get_user")
+        self.fill(key, record, generation)
+        return record[:3] if record else None
+
+    async def user_exists(self, guild_id, user_id):
+        return await self.get_record(guild_id, user_id) is not None
+
+    async def get_notes(self, guild_id, user_id):
+        """Returns a (notes,) row for the user, or None when there is no record."""
+        record = await self.get_record(guild_id, user_id)
+        return (record[2],) if record else None
+
+    async def set_notes(self, guild_id, user_id, notes):
+        await self.db.execute(UPDATE_NOTES, (notes, guild_id, user_id))
+        key = ("user", guild_id, user_id)
+        record = self.cache.get(key)
+        if record:
+            self.write_through(key, (record[0], record[1], notes, record[3]))
+        else:
+            self.forget(key)
+
+    async def recent_entries(self, guild_id, user_id):
+        """Returns the user's newest log entries, the tail shown in warnings, through the cache."""
+        key = ("recent", guild_id, user_id)
+        entries = self.cached(key)
+        if entries is MISSING:
+            generation = self.generation(key)
+            entries = await self.infraction_log.recent(guild_id, user_id)
+            self.fill(key, entries, generation)
+        return entries
+
+    async def count_entries(self, guild_id, user_id):
+        key = ("count", guild_id, user_id)
+        count = self.cached(key)
+        if count is MISSING:
+            generation = self.generation(key)
+            count = await self.infraction_log.count(guild_id, user_id)
+            self.fill(key, count, generation)
+        return count
+
+    async def log_entry(self, guild_id, user_id, entry):
+        """Records a log entry that doesn't change points, such as a ban or unban."""
+        await self.infraction_log.add(guild_id, user_id, entry)
+        self.forget(("recent", guild_id, user_id))
+        self.forget(("count", guild_id, user_id))
+
+    async def add_points(self, guild_id, user_id, points, entry):
+        """Adds points and logs the entry in one transaction, creating the user if needed.
+
+        Returns (existed, new_points).
+        """
+        def work(cursor):
+            now = int(time.time())
+            cursor.execute(SELECT_POINTS + self.row_lock, (guild_id, user_id))
+            result = cursor.fetchone()
+            if result:
+                current, last_decay_at = result
+                if self.lazy_decay:
+                    current, last_decay_at = self.decayed(current, last_decay_at, now)
+                new_points = current + points
+                cursor.execute(UPDATE_POINTS, (new_points, last_decay_at, guild_id, user_id))
+            else:
+                new_points = points
+                last_decay_at = now
+                cursor.execute(INSERT_USER, (guild_id, user_id, "active", points, None, "", now))
+            self.infraction_log.add_with_cursor(cursor, guild_id, user_id, entry)
+            return result is not None, new_points, last_decay_at
+        try:
+            existed, new_points, last_decay_at = await self.db.transaction(work, label="add_points")
+        except Exception:
+            self.invalidate(guild_id, user_id)
+            raise
+
+        # Write through: status and notes are untouched by this path, so a cached row only needs new points
+        key = ("user", guild_id, user_id)
+        record = self.cache.get(key, MISSING)
+        if record is None and not existed:
+            self.write_through(key, (new_points, "active", "", last_decay_at))
+        elif record is not None and record is not MISSING:
+            self.write_through(key, (new_points, record[1], record[2], last_decay_at))
+        else:
+            self.forget(key)
+        self.forget(("recent", guild_id, user_id))
+        self.forget(("count", guild_id, user_id))
+        return existed, new_points
+
+    def upsert_points_query(self, now):
+        """The UPSERT_POINTS statement for this dialect, applying pending lazy decay before adding."""
+        if self.lazy_decay:
+            ticks, decayed_points = self.decay_expressions(now)
+            return UPSERT_POINTS[self.db.dialect].format(
+                points=decayed_points, last_decay_at=f"last_decay_at + {ticks} * {int(self.decay_interval)}"
+            )
+        return UPSERT_POINTS[self.db.dialect].format(points="points", last_decay_at="last_decay_at")
+
+    async def apply_point_deltas(self, deltas):
+        """Group commit for buffered accruals: {(guild_id, user_id): (points, [entries])} in one transaction.
+
+        Each user gets one atomic points = points + delta upsert, so nothing is read back first.
+        """
+        now = int(time.time())
+        upsert = self.upsert_points_query(now)
+        rows = [(guild_id, user_id, points, now) for (guild_id, user_id), (points, _) in deltas.items()]
+        entries = [(guild_id, user_id, entry) for (guild_id, user_id), (_, logged) in deltas.items() for entry in logged]
+
+        def work(cursor):
+            cursor.executemany(upsert, rows)
+            self.infraction_log.add_entries_with_cursor(cursor, entries)
+        try:
+            await self.db.transaction(work, label="apply_point_deltas")
+        finally:
+            for guild_id, user_id in deltas:
+                self.invalidate(guild_id, user_id)
+
+    async def add_points_bulk(self, guild_id, user_ids, points, entry):
+        """Adds the same points and log entry to many users in one transaction.
+
+        Returns (created, totals) where created is the set of user_ids that had no record and totals maps each
+        user_id to its new points.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        now = int(time.time())
+        upsert = self.upsert_points_query(now)
+
+        def select_points(cursor):
+            found = {}
+            for i in range(0, len(user_ids), BULK_CHUNK):
+                chunk = user_ids[i:i + BULK_CHUNK]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(
+                    f"SELECT user_id, points FROM users WHERE guild_id = %s AND user_id IN ({placeholders})",
+                    (guild_id, *chunk),
+                )
+                found.update(cursor.fetchall())
+            return found
+
+        def work(cursor):
+            existing = select_points(cursor)
+            cursor.executemany(upsert, [(guild_id, user_id, points, now) for user_id in user_ids])
+            self.infraction_log.add_many_with_cursor(cursor, guild_id, user_ids, entry)
+            return {user_id for user_id in user_ids if user_id not in existing}, select_points(cursor)
+        try:
+            return await self.db.transaction(work, label="add_points_bulk")
+        finally:
+            for user_id in user_ids:
+                self.invalidate(guild_id, user_id)
+
+    def shard_clause(self, shard_count, shard_ids):
+        """SQL filter limiting a query to guilds on the given shards."""
+        if not shard_ids:
+            return "", ()
+        shard_expr = "MOD(guild_id >> 22, %s)" if self.is_mysql else "((guild_id >> 22) % %s)"
+        placeholders = ", ".join(["%s"] * len(shard_ids))
+        return f" AND {shard_expr} IN ({placeholders})", (shard_count, *shard_ids)
+
+    async def decay(self, amount, tiers, shard_count=None, shard_ids=None):
+        """Decays every user's points in one set-based pass.
+
+        Returns (rows_decayed, crossed) where crossed lists (guild_id, user_id, points) for rows that
+        entered a new warning/ban tier.
+        """
+        greatest = "GREATEST" if self.is_mysql else "MAX"
+        new_points = f"{greatest}(points - {int(amount)}, 0)"
+        new_status = status_case(new_points, tiers)
+        guild_clause, guild_params = self.shard_clause(shard_count, shard_ids)
+        lock = self.row_lock
+        now = int(time.time())
+
+        def work(cursor):
+            # Only rows whose tier changes to a warning/ban tier need anything from Python
+            cursor.execute(
+                f"SELECT guild_id, user_id, {new_points} FROM users "
+                f"WHERE points > 0 AND {new_points} >= %s AND status <> {new_status}{guild_clause}{lock}",
+                (tiers[0]["points"], *guild_params),
+            )
+            crossed = cursor.fetchall()
+
+            # Status is assigned first so both columns are computed from the pre-decay points
+            cursor.execute(
+                f"UPDATE users SET status = {new_status}, points = {new_points}, last_decay_at = {now} "
+                f"WHERE points > 0{guild_clause}",
+                guild_params,
+            )
+            return cursor.rowcount, crossed
+        try:
+            return await self.db.transaction(work, label="decay_points")
+        finally:
+            # Every row with points changed, so nothing cached about users is current any more
+            self.invalidate_all()
+
+    def decay_expressions(self, now):
+        """SQL for the lazy decay ticks elapsed at now and the points left after applying them."""
+        greatest = "GREATEST" if self.is_mysql else "MAX"
+        division = "DIV" if self.is_mysql else "/"
+        ticks = f"({greatest}({int(now)} - last_decay_at, 0) {division} {int(self.decay_interval)})"
+        return ticks, f"{greatest}(points - {int(self.decay_points)} * {ticks}, 0)"
+
+    async def sweep_tiers(self, tiers, shard_count=None, shard_ids=None):
+        """Lazy-mode counterpart of decay: only rows whose decayed points change their tier are written.
+
+        Candidates come from the points and status indexes, since a row can only be in a warning tier if its
+        stored points reach the lowest tier, and only rows with a non-active status can fall out of one.
+        Returns (rows_updated, crossed) with crossed in the same shape as decay.
+        """
+        interval = int(self.decay_interval)
+        ticks, new_points = self.decay_expressions(int(time.time()))
+        new_status = status_case(new_points, tiers)
+        guild_clause, guild_params = self.shard_clause(shard_count, shard_ids)
+        candidates = f"(points >= %s OR status <> 'active') AND status <> {new_status}{guild_clause}"
+        params = (tiers[0]["points"], *guild_params)
+
+        def work(cursor):
+            cursor.execute(f"SELECT guild_id, user_id, {new_points} FROM users WHERE {candidates}{self.row_lock}", params)
+            changed = cursor.fetchall()
+
+            # Columns are assigned in dependency order: last_decay_at feeds both expressions so it goes last
+            cursor.execute(
+                f"UPDATE users SET status = {new_status}, points = {new_points}, "
+                f"last_decay_at = last_decay_at + {ticks} * {interval} WHERE {candidates}",
+                params,
+            )
+            return cursor.rowcount, changed
+        rowcount, changed = await self.db.transaction(work, label="sweep_tiers")
+        for guild_id, user_id, _ in changed:
+            self.forget(("user", guild_id, user_id))
+        return rowcount, [row for row in changed if row[2] >= tiers[0]["points"]]
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+from datetime import datetime
+from utils.database import create_database
+from utils.infractions import ENTRY_COLUMNS, INSERT_ENTRY, entry_row, row_entry, unpack_entries
+from utils.migrations import apply_migrations
+
+# Every record in an export carries one of these in its "record" field
+CSV_FIELDS = [
+    "record", "guild_id", "user_id", "mod_role_id", "chat_words", "status", "points", "notes", "last_decay_at",
+    "action", "action_by", "action_by_name", "word", "points_added", "note", "timestamp",
+    "matched_text",
+]
+
+SELECT_GUILDS = "SELECT guild_id, mod_role_id, chat_words FROM guild_settings"
+SELECT_USERS = "SELECT guild_id, user_id, status, points, notes, last_decay_at FROM users"
+SELECT_ENTRIES = f"SELECT guild_id, user_id, {ENTRY_COLUMNS} FROM infraction_log"
+SELECT_ARCHIVE = "SELECT guild_id, user_id, data FROM infraction_archive"
+
+UPSERT_GUILD = {
+    "mysql": "INSERT INTO guild_settings (guild_id, mod_role_id, chat_words) VALUES (%s, %s, %s) "
+             "ON DUPLICATE KEY UPDATE mod_role_id = VALUES(mod_role_id), chat_words = VALUES(chat_words)",
+    "sqlite": "INSERT INTO guild_settings (guild_id, mod_role_id, chat_words) VALUES (%s, %s, %s) "
+              "ON CONFLICT (guild_id) DO UPDATE SET mod_role_id = excluded.mod_role_id, chat_words = excluded.chat_words",
+}
+UPSERT_USER = {
+    "mysql": "INSERT INTO users (guild_id, user_id, status, points, notes, last_decay_at) VALUES (%s, %s, %s, %s, %s, %s) "
+             "ON DUPLICATE KEY UPDATE status = VALUES(status), points = VALUES(points), notes = VALUES(notes), "
+             "last_decay_at = VALUES(last_decay_at)",
+    "sqlite": "INSERT INTO users (guild_id, user_id, status, points, notes, last_decay_at) VALUES (%s, %s, %s, %s, %s, %s) "
+              "ON CONFLICT (guild_id, user_id) DO UPDATE SET status = excluded.status, points = excluded.points, "
+              "notes = excluded.notes, last_decay_at = excluded.last_decay_at",
+}
+
+
+def guild_filter(query, guild_id, order_by):
+    if guild_id is None:
+        return f"{query} ORDER BY {order_by}", None
+    return f"{query} WHERE guild_id = %s ORDER BY {order_by}", (guild_id,)
+
+
+async def export_records(db, guild_id=None, batch_size=1000):
+    """Yields batches of export records: guild settings, then users, then live and archived log entries."""
+    query, params = guild_filter(SELECT_GUILDS, guild_id, "guild_id")
+    async for rows in db.stream(query, params, batch_size):
+        yield [
+            {"record": "guild", "guild_id": g, "mod_role_id": role, "chat_words": json.loads(words) if words else {}}
+            for g, role, words in rows
+        ]
+
+    query, params = guild_filter(SELECT_USERS, guild_id, "guild_id, user_id")
+    async for rows in db.stream(query, params, batch_size):
+        yield [
+            {"record": "user", "guild_id": g, "user_id": u, "status": status, "points": points, "notes": notes,
+             "last_decay_at": last_decay_at}
+            for g, u, status, points, notes, last_decay_at in rows
+        ]
+
+    query, params = guild_filter(SELECT_ARCHIVE, guild_id, "guild_id, user_id, month")
+    # One archive row is one user-month, so batches stay small even though each row expands
+    async for rows in db.stream(query, params, 1):
+        for g, u, data in rows:
+            yield [{"record": "infraction", "guild_id": g, "user_id": u, **entry} for entry in unpack_entries(data)]
+
+    query, params = guild_filter(SELECT_ENTRIES, guild_id, "id")
+    async for rows in db.stream(query, params, batch_size):
+        yield [{"record": "infraction", "guild_id": row[0], "user_id": row[1], **row_entry(row[2:])} for row in rows]
+
+
+class ExportWriter:
+    """Gzip-compressed JSONL or CSV output, written a batch at a time."""
+
+    def __init__(self, path, fmt):
+        self.file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        self.csv = csv.DictWriter(self.file, CSV_FIELDS, restval="", extrasaction="ignore") if fmt == "csv" else None
+        if self.csv:
+            self.csv.writeheader()
+
+    def write(self, records):
+        if self.csv:
+            for record in records:
+                if "chat_words" in record:
+                    record = {**record, "chat_words": json.dumps(record["chat_words"])}
+                self.csv.writerow(record)
+        else:
+            self.file.writelines(json.dumps(record, default=str) + "\n" for record in records)
+
+    def close(self):
+        self.file.close()
+
+
+async def export_data(db, path, guild_id=None, fmt="jsonl", batch_size=1000):
+    """Streams one guild, or every guild, to a compressed file. Returns the record count."""
+    writer = ExportWriter(path, fmt)
+    total = 0
+    try:
+        async for records in export_records(db, guild_id, batch_size):
+            # Compression and disk writes stay off the event loop
+            await asyncio.to_thread(writer.write, records)
+            total += len(records)
+    finally:
+        writer.close()
+    return total
+
+
+def read_records(path):
+    """Yields records from an export, detecting CSV by its header line."""
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        first = f.readline()
+        f.seek(0)
+        if first.startswith("record,"):
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if value != ""}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def optional_int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def record_params(record):
+    """Returns (kind, params) for the import statement matching a record."""
+    kind = record["record"]
+    guild_id = int(record["guild_id"])
+    if kind == "guild":
+        chat_words = record.get("chat_words") or {}
+        if isinstance(chat_words, str):
+            chat_words = json.loads(chat_words)
+        return kind, (guild_id, optional_int(record.get("mod_role_id")), json.dumps(chat_words))
+    user_id = int(record["user_id"])
+    if kind == "user":
+        return kind, (
+            guild_id, user_id, record.get("status") or "active", int(record.get("points") or 0),
+            record.get("notes") or "", optional_int(record.get("last_decay_at")) or int(datetime.now().timestamp()),
+        )
+    entry = dict(record)
+    entry["action_by"] = optional_int(entry.get("action_by"))
+    entry["points_added"] = int(entry.get("points_added") or 0)
+    return kind, entry_row(guild_id, user_id, entry)
+
+
+async def import_data(db, path, batch_size=1000):
+    """Loads an export with batched upserts. Returns {record kind: count}.
+
+    Guild settings and users are upserted, so re-running an import is safe for them. Log entries have no
+    natural key and are appended, so import each export only once.
+    """
+    statements = {"guild": UPSERT_GUILD[db.dialect], "user": UPSERT_USER[db.dialect], "infraction": INSERT_ENTRY}
+    batches = {kind: [] for kind in statements}
+    counts = {kind: 0 for kind in statements}
+    records = read_records(path)
+    while True:
+        # Parsing happens on a thread a chunk at a time so the file is never fully in memory
+        chunk = await asyncio.to_thread(lambda: [record for _, record in zip(range(batch_size), records)])
+        for record in chunk:
+            kind, params = record_params(record)
+            batches[kind].append(params)
+        # Users reference guilds and entries reference users, so batches are flushed in that order
+        for kind, statement in statements.items():
+            if batches[kind] and (len(batches[kind]) >= batch_size or not chunk):
+                await db.executemany(statement, batches[kind])
+                counts[kind] += len(batches[kind])
+                batches[kind] = []
+        if not chunk:
+            return counts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Export or import moderation data.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="stream data to a .jsonl.gz or .csv.gz file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--guild", type=int, help="only this guild id")
+    export_parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    import_parser = sub.add_parser("import", help="load an export file with batched upserts")
+    import_parser.add_argument("path")
+    args = parser.parse_args()
+
+    with open("datastores/config.json", 'r') as f:
+        config = json.load(f)
+    db = create_database(config['database'])
+    try:
+        await apply_migrations(db)
+        if args.command == "export":
+            total = await export_data(db, args.path, args.guild, args.format)
+            print(f"Exported {total} records to {args.path}.")
+        else:
+            counts = await import_data(db, args.path)
+            print("Imported " + ", ".join(f"{count} {kind} records" for kind, count in counts.items()) + ".")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    # python -m utils.transfer export|import ...
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import zipfile
+import requests
+
+# Downloaded bundles are stored by the sha256 of their zip so a cached copy can always be verified
+BUNDLE_DIR = os.path.join("datastores", "bundles")
+STATE_FILE = os.path.join(BUNDLE_DIR, "state.json")
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state):
+    """Writes the bundle state through a temporary file so it is never left half written."""
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    temp_file = f"{STATE_FILE}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(temp_file, STATE_FILE)
+
+
+def bundle_path(digest):
+    return os.path.join(BUNDLE_DIR, f"{digest}.zip")
+
+
+def github_api_url(repo_url):
+    owner, repo = repo_url.rstrip('/').split('/')[-2:]
+    return f"https://api.github.com/repos/{owner}/{repo}"
+
+
+def latest_commit(repo_url, branch, etag=None):
+    """Returns (sha, etag) for the branch head, or (None, etag) when GitHub reports it unchanged."""
+    headers = {"Accept": "application/vnd.github.sha"}
+    if etag:
+        headers["If-None-Match"] = etag
+    response = requests.get(f"{github_api_url(repo_url)}/commits/{branch}", headers=headers, timeout=15)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.text.strip(), response.headers.get("ETag")
+
+
+def download_bundle(repo_url, sha):
+    """Downloads the repository zip for a commit into the bundle cache and returns its digest."""
+    zip_url = f"{repo_url}/archive/{sha}.zip"
+    print(f"Downloading repository from {zip_url}...")
+    response = requests.get(zip_url, timeout=60)
+    response.raise_for_status()
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    temp_file = f"{bundle_path(digest)}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(response.content)
+    os.replace(temp_file, bundle_path(digest))
+    return digest
+
+
+def verify_bundle(digest):
+    """Checks that a cached bundle still matches its digest and is a readable zip with a functions folder."""
+    try:
+        with open(bundle_path(digest), 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return False
+    if hashlib.sha256(content).hexdigest() != digest:
+        return False
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
+            return zip_file.testzip() is None and find_functions_prefix(zip_file) is not None
+    except zipfile.BadZipFile:
+        return False
+
+
+def find_functions_prefix(zip_file):
+    """Returns the archive path of the functions folder, e.g. 'repo-<sha>/functions/'."""
+    for name in zip_file.namelist():
+        parts = name.split('/')
+        if len(parts) >= 3 and parts[1] == "functions":
+            return f"{parts[0]}/functions/"
+    return None
+
+
+def install_bundle(digest, target_folder="functions"):
+    """Extracts the bundle's functions folder next to the target and swaps it in with renames."""
+    staging_folder = f"{target_folder}.new"
+    previous_folder = f"{target_folder}.old"
+    for folder in (staging_folder, previous_folder):
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+
+    with zipfile.ZipFile(bundle_path(digest)) as zip_file:
+        prefix = find_functions_prefix(zip_file)
+        for name in zip_file.namelist():
+            if not name.startswith(prefix) or name.endswith('/'):
+                continue
+            destination = os.path.join(staging_folder, *name[len(prefix):].split('/'))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            with zip_file.open(name) as source, open(destination, 'wb') as target:
+                shutil.copyfileobj(source, target)
+
+    if os.path.exists(target_folder):
+        os.rename(target_folder, previous_folder)
+    os.rename(staging_folder, target_folder)
+    if os.path.exists(previous_folder):
+        shutil.rmtree(previous_folder)
+    print(f"Installed bundle {digest[:12]} into {target_folder}.")
+
+
+def prune_bundles(keep):
+    """Removes cached bundles that are neither current nor pending."""
+    for filename in os.listdir(BUNDLE_DIR):
+        if filename.endswith('.zip') and filename[:-4] not in keep:
+            os.remove(os.path.join(BUNDLE_DIR, filename))
+
+
+def apply_pending_bundle():
+    """Installs a bundle fetched during the previous run, before any extension is imported."""
+    state = load_state()
+    pending = state.get('pending')
+    if not pending:
+        return False
+    if not verify_bundle(pending['digest']):
+        print(f"Pending bundle {pending['digest'][:12]} failed verification, keeping the current functions.")
+        state.pop('pending')
+        save_state(state)
+        return False
+    install_bundle(pending['digest'])
+    state['current'] = state.pop('pending')
+    save_state(state)
+    return True
+
+
+def fetch_update(config):
+    """Fetches the branch head if it changed and stages it to be installed on the next start."""
+    repo_url = config['repo_url']
+    branch = config.get('repo_branch', 'main')
+    state = load_state()
+    try:
+        sha, etag = latest_commit(repo_url, branch, state.get('etag'))
+        known = state.get('pending') or state.get('current') or {}
+        if sha is None or sha == known.get('commit'):
+            print("Functions bundle is up to date.")
+            return False
+        digest = download_bundle(repo_url, sha)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to check for a new functions bundle: {e}")
+        return False
+
+    if not verify_bundle(digest):
+        print(f"Downloaded bundle {digest[:12]} failed verification.")
+        return False
+    state['etag'] = etag
+    state['pending'] = {"commit": sha, "digest": digest}
+    save_state(state)
+    prune_bundles({bundle['digest'] for bundle in (state.get('current'), state['pending']) if bundle})
+    print(f"Staged functions bundle {sha[:12]}, it will be installed on the next start.")
+    return True
+
+
+def load_github(config):
+    """Boots from the last good bundle and checks GitHub for a newer one in the background."""
+    if not config['use_Git']:
+        return None
+    apply_pending_bundle()
+    thread = threading.Thread(target=fetch_update, args=(config,), name="bundle-update", daemon=True)
+    thread.start()
+    return thread
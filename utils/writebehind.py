@@ -0,0 +1,135 @@
+import asyncio
+
+
+class PointWriteBuffer:
+    """Write-behind buffer that coalesces point accruals per user and group-commits them.
+
+    Accruals are held for at most flush_interval_ms (the durability window) or until max_events arrive, then
+    written by ModerationRepository.apply_point_deltas in one transaction. If that transaction fails, each user is
+    retried on its own so one bad row cannot hold back the rest.
+    """
+
+    def __init__(self, repository, config=None):
+        config = config or {}
+        self.repository = repository
+        self.enabled = config.get('enabled', True)
+        self.interval = config.get('flush_interval_ms', 250) / 1000
+        self.max_events = config.get('max_events', 500)
+        # Past this many held accruals, new ones are written straight through instead of buffered
+        self.max_buffered = config.get('max_buffered', 10000)
+        # Failed flushes a user's accruals survive before they are written row by row or dropped
+        self.max_attempts = config.get('max_attempts', 5)
+        self.stop_attempts = config.get('stop_attempts', 3)
+        self.retry_delay = config.get('retry_delay', 0.5)
+        self.pending = {}  # (guild_id, user_id) -> [(points, entry), ...]
+        self.failures = {}  # (guild_id, user_id) -> failed flushes so far
+        self.events = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.stopping = False
+        self.lock = asyncio.Lock()
+
+    def start(self):
+        """Starts the flush task, must be called from a running event loop."""
+        if self.enabled and self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the flush task and writes everything still buffered, retrying with backoff."""
+        if self.task is not None:
+            # Let an in-flight flush finish rather than cancelling it halfway through a transaction
+            self.stopping = True
+            self.wakeup.set()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        delay = self.retry_delay
+        for _ in range(self.stop_attempts):
+            if await self.flush():
+                return
+            await asyncio.sleep(delay)
+            delay *= 2
+        # Last resort before shutting down: the row-at-a-time path, logging whatever still fails
+        async with self.lock:
+            batch, self.pending = self.pending, {}
+            self.events = 0
+            self.failures.clear()
+            for key, events in batch.items():
+                await self._write_through(key, events)
+
+    @property
+    def depth(self):
+        return self.events
+
+    async def add(self, guild_id, user_id, points, entry):
+        """Buffers an accrual, or writes it straight through when the buffer is disabled, stopped, or full."""
+        if self.task is None or self.events >= self.max_buffered:
+            await self.repository.add_points(guild_id, user_id, points, entry)
+            return
+        events = self.pending.get((guild_id, user_id))
+        if events is None:
+            events = self.pending[(guild_id, user_id)] = []
+        events.append((points, entry))
+        self.events += 1
+        if self.events >= self.max_events:
+            self.wakeup.set()
+
+    async def flush(self):
+        """Writes the buffered accruals in one transaction, falling back to one transaction per user.
+
+        Returns False if anything had to be put back for a later flush.
+        """
+        async with self.lock:
+            if not self.pending:
+                return True
+            batch, self.pending = self.pending, {}
+            events, self.events = self.events, 0
+            try:
+                await self.repository.apply_point_deltas(self._deltas(batch))
+                for key in batch:
+                    self.failures.pop(key, None)
+                return True
+            except Exception as e:
+                print(f"Error flushing {events} buffered point accruals, writing them per user: {e}")
+
+            flushed = True
+            for key, events in batch.items():
+                try:
+                    await self.repository.apply_point_deltas(self._deltas({key: events}))
+                    self.failures.pop(key, None)
+                    continue
+                except Exception as e:
+                    error = e
+                failures = self.failures.get(key, 0) + 1
+                if failures < self.max_attempts:
+                    self.failures[key] = failures
+                    # Back ahead of anything buffered meanwhile, so entries keep their order
+                    self.pending.setdefault(key, [])[:0] = events
+                    self.events += len(events)
+                    flushed = False
+                    continue
+                self.failures.pop(key, None)
+                print(f"Buffered points for user {key[1]} in guild {key[0]} failed {failures} flushes: {error}")
+                await self._write_through(key, events)
+            return flushed
+
+    @staticmethod
+    def _deltas(batch):
+        return {key: (sum(points for points, _ in events), [entry for _, entry in events]) for key, events in batch.items()}
+
+    async def _write_through(self, key, events):
+        """Writes accruals one at a time with add_points, dropping and logging any that still fail."""
+        guild_id, user_id = key
+        for points, entry in events:
+            try:
+                await self.repository.add_points(guild_id, user_id, points, entry)
+            except Exception as e:
+                print(f"Dropping {points} buffered points for user {user_id} in guild {guild_id}: {e}")
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()